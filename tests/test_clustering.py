@@ -78,6 +78,7 @@ class MockIntegrator(ReactiveNestedSampler):
         self.use_mpi = False
         self.mpi_size = 1
         self.mpi_rank = 0
+        self.num_threads = 1
         self.region = None
         self.transformLayer = None
         self.wrapped_axes = []
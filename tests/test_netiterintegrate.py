@@ -3,6 +3,8 @@ import os
 import numpy as np
 from ultranest.store import TextPointStore
 from ultranest.netiter import PointPile, TreeNode, count_tree, print_tree, dump_tree
+from ultranest.netiter import ArrayTree, ArrayBreadthFirstIterator, count_tree_between, find_nodes_before
+from ultranest.netiter import logz_sequence
 from ultranest.netiter import SingleCounter, MultiCounter, BreadthFirstIterator
 
 
@@ -375,6 +377,237 @@ def test_treedump():
 	dump_tree("test_tree.hdf5", tree.children, pp)
 	os.remove("test_tree.hdf5")
 	
+def test_pointpile():
+	pp = PointPile(2, 3, chunksize=4)
+	for i in range(10):
+		assert pp.add([i, i], [i, i, -i]) == i
+	assert pp.us.shape[0] == 16, pp.us.shape
+	nodes = pp.make_nodes([0.5, 1.5], [[10, 10], [11, 11]], [[10, 10, -10], [11, 11, -11]])
+	assert [n.id for n in nodes] == [10, 11]
+	assert [n.value for n in nodes] == [0.5, 1.5]
+	assert list(pp.add_many(np.zeros((0, 2)), np.zeros((0, 3)))) == []
+	pp.reserve(100)
+	assert pp.us.shape[0] == 100, pp.us.shape
+	assert pp.nrows == 12
+	assert (pp.getu(np.arange(12))[:,0] == np.arange(12)).all()
+	assert (pp.getp(np.arange(12))[:,2] == -np.arange(12)).all()
+	
+def make_random_tree(nroots, nnodes, ties=False):
+	pp = PointPile(1, 1)
+	tree = TreeNode(id=-1, value=-np.inf)
+	leaves = []
+	for i in range(nroots):
+		j = np.random.randint(3) if ties else np.random.uniform()
+		node = pp.make_node(j, [j], [j])
+		tree.children.append(node)
+		leaves.append(node)
+	for i in range(nnodes):
+		parent = leaves[np.random.randint(len(leaves))]
+		j = parent.value + (np.random.randint(1, 3) if ties else np.random.exponential())
+		node = pp.make_node(j, [j], [j])
+		parent.children.append(node)
+		leaves.append(node)
+	return tree, pp
+
+@pytest.mark.parametrize("ties", [False, True])
+def test_arraytree(ties):
+	np.random.seed(1)
+	for nroots, nnodes in (1, 0), (3, 5), (40, 400):
+		tree, pp = make_random_tree(nroots, nnodes, ties=ties)
+		atree = ArrayTree.from_roots(tree.children)
+		assert atree.ordered
+		assert len(atree) == nroots + nnodes
+		assert atree.nchildren.sum() == nnodes
+
+		# compare to walking the tree
+		explorer = BreadthFirstIterator(tree.children)
+		values = []
+		ids = []
+		widths = []
+		edges = []
+		while True:
+			next_node = explorer.next_node()
+			if next_node is None:
+				break
+			rootid, node, (_, active_rootids, _, _) = next_node
+			values.append(node.value)
+			ids.append(node.id)
+			widths.append(len(active_rootids))
+			edges += [(node.id, c.id, c.value) for c in node.children]
+			explorer.expand_children_of(rootid, node)
+		order = atree.processing_order()
+		assert (atree.values[order] == values).all()
+		# tied nodes are processed in the order they became active
+		assert (atree.ids[order] == ids).all()
+		assert (atree.widths() == widths).all()
+		assert list(zip(*[e.tolist() for e in atree.edges()])) == edges
+		# a copy with new nodes has the same structure
+		atree2 = ArrayTree.from_roots(atree.to_roots())
+		assert (atree2.values == atree.values).all()
+		assert (atree2.ids == atree.ids).all()
+		assert (atree2.parents == atree.parents).all()
+		assert not any(n2 is n for n2, n in zip(atree2.nodes, atree.nodes))
+		# a part of the tree: children have higher values than their parents
+		if nnodes > 0:
+			keep = atree.values <= np.median(atree.values)
+			atree3 = ArrayTree.from_roots(atree.to_roots(keep=keep))
+			assert len(atree3) == keep.sum()
+			assert sorted(atree3.ids.tolist()) == sorted(atree.ids[keep].tolist())
+
+		for lo, hi in (-np.inf, np.inf), (0.5, 2), (1, 1.5), (10, 20):
+			mask = np.logical_and(np.array(values) >= lo, np.array(values) <= hi)
+			expected = (mask.sum(), max(np.array(widths)[mask], default=0))
+			assert count_tree_between(tree.children, lo, hi) == expected
+
+		for value in 0.5, 1, 2, 5:
+			# walk the tree
+			expected_parents = []
+			expected_weights = []
+			nodeweights = {n.id: 1. for n in tree.children}
+			explorer = BreadthFirstIterator(tree.children)
+			while True:
+				next_node = explorer.next_node()
+				if next_node is None:
+					break
+				rootid, node, _ = next_node
+				if node.value >= value:
+					expected_parents.append(tree)
+					expected_weights.append(1)
+					break
+				elif any(n.value >= value for n in node.children):
+					expected_parents.append(node)
+					expected_weights.append(nodeweights[node.id])
+					explorer.drop_next_node()
+				else:
+					explorer.expand_children_of(rootid, node)
+					nodeweights.update({n.id: nodeweights[node.id] * len(node.children) for n in node.children})
+
+			parents, weights = find_nodes_before(tree, value)
+			assert parents == expected_parents
+			assert weights == expected_weights
+
+def test_array_breadthfirst_iterator():
+	np.random.seed(2)
+	for ties in False, True:
+		tree, pp = make_random_tree(20, 300, ties=ties)
+		atree = ArrayTree.from_roots(tree.children)
+		walks = []
+		for explorer in BreadthFirstIterator(tree.children), ArrayBreadthFirstIterator(atree):
+			walk = []
+			while True:
+				next_node = explorer.next_node()
+				if next_node is None:
+					break
+				rootid, node, (active_nodes, active_rootids, active_values, active_nodeids) = next_node
+				assert [n.id for n in active_nodes] == active_nodeids.tolist()
+				# compare active sets, regardless of their order
+				walk.append((rootid, node.id, sorted(zip(active_nodeids.tolist(), active_rootids.tolist(), active_values.tolist()))))
+				# drop some subtrees
+				if node.id % 7 == 0:
+					explorer.drop_next_node()
+				else:
+					explorer.expand_children_of(rootid, node)
+			walks.append(walk)
+		assert walks[0] == walks[1]
+
+		# integration gives the same result as with the priority queue
+		np.random.seed(1)
+		_, results = logz_sequence(tree, pp, random=False)
+		np.random.seed(1)
+		_, results2 = logz_sequence(tree, pp, random=False, onNode=lambda node, main_iterator: None)
+		assert results['logz'] == results2['logz']
+		assert (results['weighted_samples']['weights'] == results2['weighted_samples']['weights']).all()
+	
+def test_breadthfirst_iterator():
+	pp = PointPile(1, 1)
+	roots = [pp.make_node(v, [v], [v]) for v in [3., 1., 2., 1.]]
+	roots[1].children.append(pp.make_node(2., [0], [0]))
+	roots[2].children += [pp.make_node(4., [0], [0]), pp.make_node(2.5, [0], [0])]
+	explorer = BreadthFirstIterator(roots)
+	visited = []
+	while True:
+		next_node = explorer.next_node()
+		if next_node is None:
+			break
+		rootid, node, (active_nodes, active_rootids, active_values, active_nodeids) = next_node
+		assert len(active_nodes) == len(active_rootids) == len(active_values) == len(active_nodeids)
+		assert sorted(active_nodeids) == sorted(n.id for n in active_nodes)
+		assert (active_values == [n.value for n in active_nodes]).all()
+		assert node.value == active_values.min()
+		assert next_node[1] is explorer.next_node()[1], "next_node should not modify the state"
+		visited.append((node.id, rootid))
+		explorer.expand_children_of(rootid, node)
+	# ties are processed in order of activation
+	assert visited == [(1, 1), (3, 3), (2, 2), (4, 1), (6, 2), (0, 0), (5, 2)], visited
+	explorer.reset()
+	assert explorer.next_node()[1] is roots[1]
+	explorer.drop_next_node()
+	assert explorer.next_node()[1] is roots[3]
+	assert len(explorer.active_node_ids) == 3
+	
+def test_multicounter_incremental():
+	np.random.seed(2)
+	tree, pp = make_random_tree(40, 1500)
+	counters = []
+	for incremental in False, True:
+		np.random.seed(1)
+		main_iterator = MultiCounter(nroots=len(tree.children), nbootstraps=10,
+			check_insertion_order=True, incremental=incremental)
+		explorer = BreadthFirstIterator(tree.children)
+		while True:
+			next_node = explorer.next_node()
+			if next_node is None:
+				break
+			rootid, node, (_, active_rootids, active_values, _) = next_node
+			if incremental:
+				assert (main_iterator.all_nlive == main_iterator.rootids[:,active_rootids].sum(axis=1)).all()
+			main_iterator.passing_node(rootid, node, active_rootids, active_values)
+			explorer.expand_children_of(rootid, node)
+		counters.append(main_iterator)
+	a, b = counters
+	assert np.allclose(a.logweights, b.logweights)
+	assert np.allclose(a.all_logZ, b.all_logZ)
+	assert np.allclose(a.all_H, b.all_H)
+	assert a.insertion_order_runs[0] == b.insertion_order_runs[0]
+	assert a.logweights.shape == (1540, 11), a.logweights.shape
+	assert a.istail.sum() == (ArrayTree.from_roots(tree.children).nchildren == 0).sum()
+	assert (a.istail == b.istail).all()
+
+def test_multicounter_batch_replacement():
+	# parallel nested sampling: 1 is removed, and replaced together
+	# with 2 by its children 5 and 6. Then 3 is replaced by 7.
+	pp = PointPile(1, 1)
+	roots = [pp.make_node(L, np.zeros(1), np.zeros(1)) for L in [1., 2., 3., 4.]]
+	roots[1].children += [pp.make_node(L, np.zeros(1), np.zeros(1)) for L in [5., 6.]]
+	roots[2].children.append(pp.make_node(7., np.zeros(1), np.zeros(1)))
+	for incremental in False, True:
+		main_iterator = MultiCounter(nroots=len(roots), nbootstraps=3, incremental=incremental)
+		main_iterator.deferred_node_ids = {roots[0].id}
+		explorer = BreadthFirstIterator(roots)
+		nlive = []
+		while True:
+			next_node = explorer.next_node()
+			if next_node is None:
+				break
+			rootid, node, (_, active_rootids, active_values, _) = next_node
+			nlive.append(len(active_values))
+			main_iterator.passing_node(rootid, node, active_rootids, active_values)
+			explorer.expand_children_of(rootid, node)
+		assert nlive == [4, 3, 4, 4, 3, 2, 1], nlive
+		assert main_iterator.istail.tolist() == [False, False, False, True, True, True, True], main_iterator.istail
+		assert np.isfinite(main_iterator.logZ)
+	# without deferred leaves, the leaf before a node with several children is tail
+	main_iterator = MultiCounter(nroots=len(roots), nbootstraps=3)
+	explorer = BreadthFirstIterator(roots)
+	while True:
+		next_node = explorer.next_node()
+		if next_node is None:
+			break
+		rootid, node, (_, active_rootids, active_values, _) = next_node
+		main_iterator.passing_node(rootid, node, active_rootids, active_values)
+		explorer.expand_children_of(rootid, node)
+	assert main_iterator.istail.tolist() == [True, False, False, True, True, True, True], main_iterator.istail
+	
 
 if __name__ == '__main__':
 	for nlive in [100, 400, 2000]:
@@ -141,6 +141,98 @@ def test_region_mean_distances():
     assert np.isclose(meandist, d / N), (meandist, d, N)
 
 
+def test_region_neighbour_index():
+    np.random.seed(1)
+    upoints = np.random.uniform(0.2, 0.5, size=(2000, 3))
+    upoints[:,1] *= 0.1
+
+    transformLayer = AffineLayer(wrapped_dims=[])
+    transformLayer.optimize(upoints, upoints)
+    region = MLFriends(upoints, transformLayer)
+    assert region.use_neighbour_index()
+    np.random.seed(2)
+    maxradiussq, enlarge = region.compute_enlargement(nbootstraps=30)
+    region.maxradiussq = maxradiussq
+    region.enlarge = enlarge
+    region.create_ellipsoid()
+    assert region.get_neighbour_index() is not None
+
+    # brute-force reference
+    bruteregion = MLFriends(upoints, transformLayer)
+    bruteregion.neighbour_index_min_points = np.inf
+    assert not bruteregion.use_neighbour_index()
+    np.random.seed(2)
+    assert (maxradiussq, enlarge) == bruteregion.compute_enlargement(nbootstraps=30)
+    bruteregion.maxradiussq = maxradiussq
+    bruteregion.enlarge = enlarge
+    bruteregion.create_ellipsoid()
+
+    bpts = transformLayer.transform(np.random.uniform(size=(4000, 3)))
+    assert (region.find_nearby(bpts) == bruteregion.find_nearby(bpts)).all()
+    assert (region.count_nearby(bpts) == bruteregion.count_nearby(bpts)).all()
+
+    # move some points in place, the index has to follow
+    for i in np.random.randint(len(upoints), size=100):
+        upoints[i] = np.random.uniform(0.2, 0.5, size=3)
+        region.unormed[i] = transformLayer.transform(upoints[i])
+        bruteregion.unormed[i] = region.unormed[i]
+        region.neighbour_index.replace(i)
+    upts = np.random.uniform(size=(4000, 3))
+    bpts = transformLayer.transform(upts)
+    assert (region.find_nearby(bpts) == bruteregion.find_nearby(bpts)).all()
+    assert (region.count_nearby(bpts) == bruteregion.count_nearby(bpts)).all()
+    assert (region.inside(upts) == bruteregion.inside(upts)).all()
+
+
+def test_region_replace_point():
+    np.random.seed(1)
+    upoints = np.random.uniform(0.2, 0.5, size=(1200, 2))
+
+    transformLayer = AffineLayer(wrapped_dims=[])
+    transformLayer.optimize(upoints, upoints)
+    region = MLFriends(upoints.copy(), transformLayer)
+    region.maxradiussq, region.enlarge = region.compute_enlargement(nbootstraps=30)
+    region.create_ellipsoid()
+    assert region.inside(upoints).all()
+
+    for i in np.random.randint(len(upoints), size=3000):
+        upoints[i] = np.random.uniform(0.2, 0.5, size=2)
+        region.replace_point(i, upoints[i])
+    assert_allclose(region.u, upoints)
+    assert_allclose(region.unormed, transformLayer.transform(upoints))
+    assert_allclose(region.ellipsoid_center, upoints.mean(axis=0))
+    assert region.inside(upoints).all()
+
+
+def test_region_bootstrap_threads():
+    np.random.seed(1)
+    upoints = np.random.uniform(0.2, 0.5, size=(400, 3))
+    transformLayer = AffineLayer(wrapped_dims=[])
+    transformLayer.optimize(upoints, upoints)
+    region = MLFriends(upoints, transformLayer)
+    results = []
+    for num_threads in 1, 4:
+        np.random.seed(2)
+        results.append(region.compute_enlargement(nbootstraps=30, num_threads=num_threads))
+    assert results[0] == results[1], results
+
+
+def test_region_bootstrap_rows():
+    np.random.seed(1)
+    upoints = np.random.uniform(0.2, 0.5, size=(400, 3))
+    transformLayer = AffineLayer(wrapped_dims=[])
+    transformLayer.optimize(upoints, upoints)
+    region = MLFriends(upoints, transformLayer)
+    np.random.seed(2)
+    selections = [np.random.randint(len(upoints), size=len(upoints)) for i in range(10)]
+    expected = region.compute_enlargement(nbootstraps=10, selections=selections)
+    for nblocks in 1, 3, 500:
+        blocks = [region.compute_enlargement(nbootstraps=10, selections=selections, rows=(i, nblocks))
+                  for i in range(nblocks)]
+        assert max(r for r, f in blocks) == expected[0], (nblocks, blocks, expected)
+        assert max(f for r, f in blocks) == expected[1], (nblocks, blocks, expected)
+
+
 if __name__ == '__main__':
     test_region_sampling_scaling(plot=True)
     test_region_sampling_affine(plot=True)
@@ -1,6 +1,8 @@
 import numpy as np
+import os
 import shutil
 import tempfile
+import time
 import pytest
 from numpy.testing import assert_allclose
 
@@ -92,6 +94,18 @@ def test_reactive_run():
 
     sampler.plot()
 
+def test_reactive_run_debug():
+    from ultranest import ReactiveNestedSampler
+    np.random.seed(1)
+
+    def loglike(z):
+        return -0.5 * (((z - 0.5) / 0.1)**2).sum(axis=1)
+
+    sampler = ReactiveNestedSampler(['a', 'b'], loglike, vectorized=True, debug=True)
+    r = sampler.run(min_num_live_points=100, max_num_improvement_loops=0)
+    assert sampler.region_checked
+    assert abs(r['logz'] - np.log(2 * np.pi * 0.1**2)) < 3 * r['logzerr'] + 0.1
+
 def test_return_summary():
     from ultranest import ReactiveNestedSampler
     sigma = np.array([0.1, 0.01])
@@ -139,6 +153,217 @@ def test_return_summary():
     assert r['weighted_samples']['bootstrapped_weights'].shape[0] == N
     assert r['weighted_samples']['logl'].shape == (N,)
 
+def test_run_likelihood_pool():
+    from ultranest import ReactiveNestedSampler
+    from concurrent.futures import ThreadPoolExecutor
+    np.random.seed(1)
+    sigma = np.array([0.1, 0.01])
+    centers = np.array([0.5, 0.75])
+    paramnames = ['a', 'b']
+
+    def loglike(theta):
+        like = -0.5 * (((theta - centers)/sigma)**2) - 0.5 * np.log(2 * np.pi * sigma**2)
+        return like.sum()
+
+    def transform(x):
+        return x
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        sampler = ReactiveNestedSampler(paramnames, loglike, transform=transform,
+            likelihood_pool=pool, likelihood_pool_size=4)
+        assert sampler.ndraw_single == 4
+        r = sampler.run(min_num_live_points=100)
+
+    print(r)
+    assert -10 < r['logz'] < 10
+    assert 0.4 < r['posterior']['mean'][0] < 0.6
+    assert 0.74 < r['posterior']['mean'][1] < 0.76
+
+    # keep the pool busy across iterations, with varying evaluation times
+    def slow_loglike(theta):
+        time.sleep(0.002 * np.random.uniform())
+        return loglike(theta)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        sampler = ReactiveNestedSampler(paramnames, slow_loglike, transform=transform,
+            likelihood_pool=pool, likelihood_pool_size=4, likelihood_pool_async=True)
+        r = sampler.run(min_num_live_points=100, max_num_improvement_loops=1)
+        assert len(sampler._proposals_in_flight) > 0
+        ncall = sampler.ncall
+        sampler._cache_unused_proposals()
+        assert len(sampler._proposals_in_flight) == 0
+        assert sampler.ncall > ncall
+
+    print(r)
+    assert abs(r['logz']) < 3 * r['logzerr'] + 0.1
+    assert 0.4 < r['posterior']['mean'][0] < 0.6
+    assert 0.74 < r['posterior']['mean'][1] < 0.76
+
+def test_run_num_workers():
+    from ultranest import ReactiveNestedSampler
+    np.random.seed(1)
+    sigma = np.array([0.1, 0.01])
+    centers = np.array([0.5, 0.75])
+    paramnames = ['a', 'b']
+
+    # not picklable, the workers are forked
+    loglike = lambda theta: (-0.5 * (((theta - centers)/sigma)**2) - 0.5 * np.log(2 * np.pi * sigma**2)).sum()
+
+    def loglike_vectorized(theta):
+        like = -0.5 * (((theta - centers)/sigma)**2) - 0.5 * np.log(2 * np.pi * sigma**2)
+        return like.sum(axis=1)
+
+    for vectorized, f in (False, loglike), (True, loglike_vectorized):
+        sampler = ReactiveNestedSampler(paramnames, f, vectorized=vectorized, num_workers=2)
+        if not vectorized:
+            assert sampler.ndraw_single == 2
+        r = sampler.run(min_num_live_points=100, max_num_improvement_loops=0)
+        print(r)
+        assert abs(r['logz']) < 3 * r['logzerr'] + 0.1
+        assert 0.4 < r['posterior']['mean'][0] < 0.6
+        assert 0.74 < r['posterior']['mean'][1] < 0.76
+        sampler.loglike_workers.close()
+
+def test_run_replace_batch():
+    from ultranest import ReactiveNestedSampler
+    from ultranest.netiter import ArrayTree
+    np.random.seed(1)
+    sigma = np.array([0.1, 0.01])
+    centers = np.array([0.5, 0.75])
+    paramnames = ['a', 'b']
+
+    def loglike(theta):
+        like = -0.5 * (((theta - centers)/sigma)**2) - 0.5 * np.log(2 * np.pi * sigma**2)
+        return like.sum(axis=1)
+
+    def transform(x):
+        return x
+
+    sampler = ReactiveNestedSampler(paramnames, loglike, transform=transform, vectorized=True)
+    r = sampler.run(min_num_live_points=400, replace_batch_size=10, max_num_improvement_loops=0)
+
+    print(r)
+    # the normalised gaussian is well within the unit cube
+    assert abs(r['logz']) < 3 * r['logzerr'] + 0.1
+    assert 0.45 < r['posterior']['mean'][0] < 0.55
+    assert 0.745 < r['posterior']['mean'][1] < 0.755
+    # points were replaced in batches
+    nchildren = [len(n.children) for n in sampler.root.children]
+    assert max(nchildren) == 10, max(nchildren)
+    # the leaves replaced in batches do not count as tail
+    assert r['logzerr_tail'] < 0.5, r['logzerr_tail']
+    # the region follows the live points, also across region rebuilds
+    tree = ArrayTree.from_roots(sampler.root.children)
+    live_ids = tree.ids[tree.nchildren == 0]
+    assert len(sampler.region_nodes) == 400, len(sampler.region_nodes)
+    assert np.isin(sampler.region_nodes, live_ids).all()
+
+    # stopping while removed points wait to be replaced
+    sampler = ReactiveNestedSampler(paramnames, loglike, transform=transform, vectorized=True)
+    r = sampler.run(min_num_live_points=100, replace_batch_size=10, max_iters=215, max_num_improvement_loops=0)
+    tree = ArrayTree.from_roots(sampler.root.children)
+    nchildren = tree.nchildren
+    # 215 nodes were removed, mostly replaced in batches of 10; before a
+    # region rebuild, a smaller batch is replaced. The last removed nodes
+    # are not replaced anymore, and end as leaves like the live points
+    assert nchildren.max() == 10, np.bincount(nchildren)
+    assert 215 - 10 < nchildren.sum() <= 215, np.bincount(nchildren)
+    assert len(sampler.region_nodes) == 100, len(sampler.region_nodes)
+    assert np.isin(sampler.region_nodes, tree.ids[nchildren == 0]).all()
+    assert np.isfinite(r['logz'])
+
+def test_run_proposal_cache():
+    from ultranest import ReactiveNestedSampler
+    np.random.seed(1)
+
+    def loglike(theta):
+        return -0.5 * (((theta - 0.5) / 0.01)**2).sum(axis=1)
+
+    def transform(x):
+        return x
+
+    sampler = ReactiveNestedSampler(['a', 'b'], loglike, transform=transform,
+        vectorized=True, max_cached_proposals=3)
+    # pretend three proposals drawn above L=-10 are left over
+    sampler.samples = np.array([[0.1, 0.1], [0.2, 0.2], [0.3, 0.3], [0.4, 0.4]])
+    sampler.samplesv = sampler.samples * 2
+    sampler.likes = np.array([-20., -5., -2., -8.])
+    sampler.samples_Lmin = -10.
+    sampler.ib = 1
+    sampler._cache_unused_proposals()
+    assert len(sampler.proposal_cache) == 3
+    # not valid below the threshold they were drawn from
+    assert sampler.proposal_cache.pop(-12.) == (None, None)
+    _, row = sampler.proposal_cache.pop(-6.)
+    assert_allclose(row, [-10., -5., 0.2, 0.2, 0.4, 0.4])
+    # the cache is bounded
+    sampler.samples_Lmin = -3.
+    sampler.ib = 0
+    sampler._cache_unused_proposals()
+    assert len(sampler.proposal_cache) == 3
+    assert_allclose(sampler.proposal_cache.Lmins, [-3., -3., -3.])
+    # unused cached proposals are not kept for more than one pass
+    sampler.ib = len(sampler.samples)
+    sampler._cache_unused_proposals()
+    assert len(sampler.proposal_cache) == 0
+
+    sampler = ReactiveNestedSampler(['a', 'b'], loglike, transform=transform, vectorized=True)
+    previous_likes = np.empty(0)
+    ncached = 0
+    for r in sampler.run_iter(min_num_live_points=100, min_ess=1000, max_num_improvement_loops=2):
+        # the cache of this pass only holds proposals left over in the previous pass
+        assert np.isin(sampler.proposal_cache.Ls, previous_likes).all()
+        ncached += len(sampler.proposal_cache.Ls)
+        previous_likes = np.asarray(sampler.likes[sampler.ib:]) if len(sampler.samples) > 0 else np.empty(0)
+    assert ncached > 0
+    assert abs(r['logz'] - np.log(2 * np.pi * 0.01**2)) < 3 * r['logzerr'] + 0.1
+
+
+def test_run_iter_lazy_results():
+    from ultranest import ReactiveNestedSampler
+    np.random.seed(1)
+
+    def loglike(theta):
+        return -0.5 * (((theta - 0.5) / 0.1)**2).sum(axis=1)
+
+    def transform(x):
+        return x
+
+    sampler = ReactiveNestedSampler(['a', 'b'], loglike, transform=transform, vectorized=True)
+    all_results = []
+    all_sequences = []
+    for r in sampler.run_iter(min_num_live_points=100, min_ess=1000, max_num_improvement_loops=2):
+        # summaries are not computed yet
+        assert 'posterior' in r and 'posterior' in r._lazy
+        assert 'insertion_order_MWW_test' in r._lazy
+        all_results.append(r)
+        all_sequences.append(sampler._run_sequence)
+    assert len(all_results) > 1
+    # the sequence of the first result is computed from the tree at that time
+    assert all_sequences[0]['sequence'][0]['niter'] == all_results[0]['niter']
+
+    # the summaries of the first result refer to the tree at that time
+    first = all_results[0]
+    assert len(first['samples']) > 0
+    assert 0.45 < first['posterior']['mean'][0] < 0.55
+    assert 'converged' in first['insertion_order_MWW_test']
+    assert sampler.run_sequence['niter'] == all_results[-1]['niter']
+    assert len(sampler.run_sequence['logl']) == all_results[-1]['niter']
+
+    # the result files are written in every pass
+    folder = tempfile.mkdtemp()
+    try:
+        sampler = ReactiveNestedSampler(['a', 'b'], loglike, transform=transform,
+            vectorized=True, log_dir=folder, resume='overwrite')
+        for r in sampler.run_iter(min_num_live_points=100, min_ess=1000, max_num_improvement_loops=2):
+            break
+        for filename in 'info/results.json', 'info/post_summary.csv', 'chains/equal_weighted_post.txt', 'chains/run.txt':
+            assert os.path.exists(os.path.join(folder, filename)), filename
+        sampler.pointstore.close()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
 @pytest.mark.parametrize("dlogz", [2.0, 0.5, 0.1])
 def test_run_resume(dlogz):
     from ultranest import ReactiveNestedSampler
@@ -182,7 +407,79 @@ def test_run_resume(dlogz):
     finally:
         shutil.rmtree(folder, ignore_errors=True)
 
-@pytest.mark.parametrize("storage_backend", ['hdf5', 'tsv', 'csv'])
+@pytest.mark.parametrize("storage_options", [
+    dict(buffer_size=100, compression='gzip'),
+    dict(buffer_size=100, lazy=True),
+])
+def test_run_resume_storage_options(storage_options):
+    from ultranest import ReactiveNestedSampler
+    sigma = 0.01
+
+    def loglike(theta):
+        return -0.5 * (((theta - 0.5)/sigma)**2).sum(axis=1) - 0.5 * np.log(2 * np.pi * sigma**2)
+
+    def myadd(row):
+        assert False, (row, 'should not need to add more points in resume')
+
+    last_results = None
+    np.random.seed(1)
+    folder = tempfile.mkdtemp()
+    try:
+        for i in range(2):
+            sampler = ReactiveNestedSampler(['a'], loglike, log_dir=folder,
+                resume=True, vectorized=True, storage_options=storage_options)
+            assert sampler.pointstore.buffer_size == 100
+            assert sampler.pointstore.lazy == storage_options.get('lazy', False)
+            r = sampler.run(log_interval=50, dlogz=0.5, min_num_live_points=400)
+            sampler.pointstore.close()
+            if i == 1:
+                sampler.pointstore.add = myadd
+            if last_results is not None:
+                assert np.isclose(last_results['logz'], r['logz'], atol=0.5)
+                assert r['ncall'] == last_results['ncall']
+            last_results = r
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+@pytest.mark.parametrize("chains_format", ['txt', 'npz', 'hdf5'])
+def test_run_chains_format(chains_format):
+    from ultranest import ReactiveNestedSampler, read_chain
+    np.random.seed(1)
+
+    def loglike(theta):
+        return -0.5 * (((theta - 0.5) / 0.1)**2).sum(axis=1)
+
+    def transform(x):
+        return x
+
+    folder = tempfile.mkdtemp()
+    try:
+        sampler = ReactiveNestedSampler(['a', 'b'], loglike, transform=transform,
+            log_dir=folder, resume='overwrite', vectorized=True, chains_format=chains_format)
+        r = sampler.run(min_num_live_points=100, max_num_improvement_loops=1)
+        sampler.pointstore.close()
+
+        columns, data = read_chain(folder, 'weighted_post')
+        assert columns == ['weight', 'logl', 'a', 'b']
+        assert_allclose(data[:,0], r['weighted_samples']['weights'])
+        assert_allclose(data[:,1], r['weighted_samples']['logl'])
+        assert_allclose(data[:,2:], r['weighted_samples']['points'])
+        columns, data = read_chain(folder, 'weighted_post_untransformed')
+        assert columns == ['weight', 'logl', 'a', 'b']
+        assert_allclose(data[:,2:], r['weighted_samples']['upoints'])
+        columns, data = read_chain(folder, 'equal_weighted_post')
+        assert columns == ['a', 'b']
+        assert_allclose(data, r['samples'])
+        columns, data = read_chain(folder, 'run')
+        assert columns[0] == 'logz'
+        assert len(data) == r['niter']
+        with pytest.raises(IOError):
+            read_chain(folder, 'nonexisting')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+@pytest.mark.parametrize("storage_backend", ['hdf5', 'tsv', 'csv', 'bin'])
 def test_reactive_run_resume_eggbox(storage_backend):
     from ultranest import ReactiveNestedSampler
     from ultranest import read_file
@@ -294,6 +591,48 @@ def test_reactive_run_resume_eggbox(storage_backend):
     finally:
         shutil.rmtree(folder, ignore_errors=True)
 
+def test_read_file_tree(monkeypatch):
+    import h5py
+    import ultranest.integrator
+    from ultranest import read_file
+    np.random.seed(1)
+    ndim = 2
+    rows = []
+    values = []
+    for i in range(20):
+        L = np.random.normal()
+        rows.append([-np.inf, L, 0] + list(np.random.uniform(size=2 * ndim)))
+        values.append(L)
+    for i in range(200):
+        Lmin = np.random.choice(values)
+        L = Lmin + np.random.exponential()
+        rows.append([Lmin, L, 0] + list(np.random.uniform(size=2 * ndim)))
+        values.append(L)
+    # a point without parent, and its child
+    Lorphan = max(values) + 2
+    rows.append([max(values) + 1, Lorphan, 0] + list(np.random.uniform(size=2 * ndim)))
+    rows.append([Lorphan, Lorphan + 1, 0] + list(np.random.uniform(size=2 * ndim)))
+    np.random.shuffle(rows[20:])
+
+    folder = tempfile.mkdtemp()
+    try:
+        os.mkdir(os.path.join(folder, 'results'))
+        with h5py.File(os.path.join(folder, 'results', 'points.hdf5'), 'w') as f:
+            f.create_dataset('points', data=np.array(rows))
+
+        sequence, results = read_file(folder, ndim, random=False, num_bootstraps=0)
+        assert results['niter'] == 220
+        # compare to replaying the exploration
+        monkeypatch.setattr(ultranest.integrator, '_tree_from_points', lambda *args: None)
+        sequence2, results2 = read_file(folder, ndim, random=False, num_bootstraps=0)
+        for k in 'logz', 'logvol', 'nlive', 'logl', 'logwt', 'insert_order':
+            assert_allclose(sequence[k], sequence2[k])
+        assert_allclose(results['weighted_samples']['upoints'], results2['weighted_samples']['upoints'])
+        assert_allclose(results['logz'], results2['logz'])
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
 def test_reactive_run_warmstart_gauss():
     from ultranest import ReactiveNestedSampler
     from ultranest import read_file
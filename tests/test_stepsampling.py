@@ -2,8 +2,9 @@ import numpy as np
 from ultranest.mlfriends import ScalingLayer, AffineLayer, MLFriends
 from ultranest import ReactiveNestedSampler
 from ultranest.stepsampler import RegionMHSampler, CubeMHSampler, CubeSliceSampler, RegionSliceSampler, SpeedVariableRegionSliceSampler, AHARMSampler, RegionBallSliceSampler
-from ultranest.stepsampler import generate_region_random_direction, ellipsoid_bracket, crop_bracket_at_unit_cube
+from ultranest.stepsampler import generate_region_random_direction, ellipsoid_bracket, crop_bracket_at_unit_cube, _prepare_steps
 from ultranest.pathsampler import SamplingPathStepSampler
+from ultranest.popstepsampler import PopulationSliceSampler
 from numpy.testing import assert_allclose
 
 #here = os.path.dirname(__file__)
@@ -71,6 +72,57 @@ def test_stepsampler_regionslice(plot=False):
     assert a.sum() > 1
     assert b.sum() > 1
 
+def test_stepsampler_popslice(plot=False):
+    np.random.seed(4)
+    ncalls = []
+    def loglike_vectorized_counting(z):
+        ncalls.append(len(z))
+        return loglike_vectorized(z)
+    sampler = ReactiveNestedSampler(paramnames, loglike_vectorized_counting, transform=transform, vectorized=True)
+    sampler.stepsampler = PopulationSliceSampler(popsize=40, nsteps=len(paramnames))
+    r = sampler.run(log_interval=50, min_num_live_points=400)
+    sampler.print_results()
+    a = (np.abs(r['samples'] - 0.7) < 0.1).all(axis=1)
+    b = (np.abs(r['samples'] - 0.3) < 0.1).all(axis=1)
+    assert a.sum() > 1
+    assert b.sum() > 1
+    # likelihood is called with many points at once
+    assert np.mean(ncalls) > 10, np.mean(ncalls)
+
+def test_popslice_returns_independent_points():
+    np.random.seed(1)
+    us = np.random.uniform(size=(400, len(paramnames)))
+    Ls = loglike_vectorized(us)
+    region = make_region(len(paramnames), us=us)
+    Lmin = np.median(Ls)
+    stepsampler = PopulationSliceSampler(popsize=20, nsteps=2)
+    nfound = 0
+    for i in range(200):
+        u, p, L, nc = stepsampler.__next__(region, Lmin, us, Ls, transform, loglike_vectorized)
+        assert nc <= 20
+        if L is not None:
+            assert u.shape == (len(L), len(paramnames)), u.shape
+            assert (L > Lmin).all()
+            assert_allclose(L, loglike_vectorized(p))
+            nfound += len(L)
+    assert nfound > 20, nfound
+
+
+def test_popslice_stepout_budget():
+    np.random.seed(1)
+    us = np.random.uniform(0.4, 0.6, size=(400, len(paramnames)))
+    Ls = np.zeros(len(us))
+    region = make_region(len(paramnames), us=us)
+    def loglike_flat(x):
+        return np.zeros(len(x))
+    stepsampler = PopulationSliceSampler(popsize=5, nsteps=2, scale=1e-3, max_stepout=2)
+    for i in range(6):
+        stepsampler.__next__(region, -1, us, Ls, transform, loglike_flat)
+    # both sides were doubled max_stepout times
+    assert (stepsampler.stage == 2).all(), stepsampler.stage
+    assert_allclose(stepsampler.left, -4)
+    assert_allclose(stepsampler.right, 4)
+
 
 def test_stepsampler_variable_speed(plot=False):
     matrices = [
@@ -396,7 +448,7 @@ def test_aharm_sampler():
     region.create_ellipsoid()
     assert region.inside(us).all()
     nsteps = 10
-    sampler = AHARMSampler(nsteps=nsteps, region_filter=True)
+    sampler = AHARMSampler(nsteps=nsteps, region_filter=True, debug=True)
 
     nfunccalls = 0
     ncalls = 0
@@ -411,6 +463,43 @@ def test_aharm_sampler():
     print("done in %d function calls, %d likelihood evals" % (nfunccalls, ncalls))
     
 
+def test_aharm_prepare_steps():
+    def loglike(theta):
+        return -0.5 * (((theta - 0.5)/0.1)**2).sum(axis=1)
+    def transform(x):
+        return x
+
+    np.random.seed(1)
+    ndim = 3
+    us = np.random.uniform(0.3, 0.7, size=(400, ndim))
+    transformLayer = AffineLayer()
+    transformLayer.optimize(us, us)
+    region = MLFriends(us, transformLayer)
+    region.maxradiussq, region.enlarge = region.compute_enlargement()
+    region.create_ellipsoid()
+    nsteps = 100
+    directions = np.array([generate_region_random_direction(us[0], region) for i in range(nsteps)])
+    ucurrent = us[np.argmax(loglike(us))]
+    point_sequence, point_expectation, intervals, nsteps_prepared = _prepare_steps(
+        0, nsteps, directions, 100000, (ucurrent, None, None), loglike, transform,
+        region, ndim, False, -np.inf, False, debug=True)
+    assert nsteps_prepared == nsteps
+    assert point_expectation.sum() == nsteps
+    assert point_expectation[-1]
+    assert len(point_sequence) == len(intervals)
+    assert (point_sequence > 0).all() and (point_sequence < 1).all()
+    assert region.inside_ellipsoid(point_sequence).all()
+    # the bracket is shrunk by each point expected to be outside
+    for i, (istep, u, v, left, right, t) in enumerate(intervals):
+        assert left <= t <= right, (left, t, right)
+        assert_allclose(point_sequence[i], u + v * t)
+    for (istep, u, v, left, right, t), expected, (istep2, u2, v2, left2, right2, t2) in zip(intervals[:-1], point_expectation, intervals[1:]):
+        if not expected:
+            assert istep2 == istep
+            assert (left2, right2) == ((left, t) if t > 0 else (t, right))
+        else:
+            assert istep2 == istep + 1
+
 def run_aharm_sampler():
     for seed in [733] + list(range(10)):
         print()
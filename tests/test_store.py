@@ -2,7 +2,7 @@ from __future__ import print_function, division
 import numpy as np
 import tempfile
 import os
-from ultranest.store import TextPointStore, HDF5PointStore, NullPointStore
+from ultranest.store import TextPointStore, HDF5PointStore, BinaryPointStore, NullPointStore, PointStack
 import pytest
 
 def test_text_store():
@@ -150,6 +150,115 @@ def test_hdf5_store():
 		os.remove(filepath)
 
 
+def test_hdf5_store_buffer():
+	import h5py
+	try:
+		fobj, filepath = tempfile.mkstemp()
+		os.close(fobj)
+
+		ptst = HDF5PointStore(filepath, 4, buffer_size=10, flush_interval=1e10, mode='w')
+		for i in range(15):
+			assert ptst.add([-np.inf, i, 413, 213], i + 1) == i
+		# first block was written, the rest is buffered
+		assert ptst.fileobj['points'].shape == (10, 4), ptst.fileobj['points'].shape
+		assert ptst.fileobj.attrs['ncalls'] == 10
+		ptst.flush()
+		assert ptst.fileobj['points'].shape == (15, 4), ptst.fileobj['points'].shape
+		assert ptst.fileobj.attrs['ncalls'] == 15
+		ptst.add([1, 15, 413, 213], 16)
+		ptst.close()
+
+		with h5py.File(filepath, 'r') as f:
+			points = f['points'][:]
+			assert f.attrs['ncalls'] == 16
+		assert points.shape == (16, 4), points.shape
+		assert (points[:,1] == np.arange(16)).all(), points
+
+		ptst = HDF5PointStore(filepath, 4, buffer_size=3)
+		assert ptst.ncalls == 16, ptst.ncalls
+		assert len(ptst.stack) == 16
+		assert ptst.add([2, 16, 413, 213], 17) == 16
+		ptst.close()
+
+		ptst = HDF5PointStore(filepath, 4, lazy=True)
+		assert len(ptst.stack) == 17
+		idx, row = ptst.pop(15)
+		assert idx == 16, idx
+		assert list(row) == [2, 16, 413, 213], row
+		assert ptst.add([2, 17, 413, 213], 18) == 17
+		idx, row = ptst.pop(14.5)
+		assert idx == 15, idx
+		assert list(row) == [1, 15, 413, 213], row
+		ptst.close()
+
+		ptst = HDF5PointStore(filepath, 4, compression='gzip', mode='w')
+		ptst.add([-np.inf, 123, 413, 213], 1)
+		ptst.close()
+		ptst = HDF5PointStore(filepath, 4)
+		assert ptst.ncalls == 1
+		assert ptst.pop(-np.inf)[1][1] == 123
+		ptst.add([-np.inf, 124, 413, 213], 2)
+		# opening the same file again closes the old store, without losing buffered points
+		ptst = HDF5PointStore(filepath, 4)
+		assert ptst.ncalls == 2
+		assert len(ptst.stack) == 2
+		ptst.close()
+	finally:
+		os.remove(filepath)
+
+
+def test_binary_store():
+	PointStore = BinaryPointStore
+	try:
+		fobj, filepath = tempfile.mkstemp()
+		os.close(fobj)
+
+		ptst = PointStore(filepath, 4)
+		assert ptst.stack_empty
+		assert ptst.pop(-np.inf)[1] is None, "new store should not return anything"
+		with pytest.raises(ValueError):
+			ptst.add([-np.inf, 123, 4], 1)
+		ptst.add([-np.inf, 123, 413, 213], 2)
+		ptst.add([101, 155, 413, 213], 3)
+		ptst.close()
+
+		points = np.memmap(filepath, dtype='<f8', mode='r', offset=PointStore.HEADER_SIZE, shape=(2, 4))
+		assert points[1,1] == 155, points
+		del points
+
+		# simulate an interrupted write
+		with open(filepath, 'ab') as f:
+			f.write(b'1234')
+
+		ptst = PointStore(filepath, 4)
+		assert ptst.ncalls == 3, (ptst.ncalls)
+		assert len(ptst.stack) == 2
+		entry = ptst.pop(-np.inf)[1]
+		assert entry[1] == 123, entry
+		assert ptst.pop(-np.inf)[1] is None, "retrieving unknown entry should fail"
+		assert ptst.add([99, 156, 413, 213], 4) == 2
+		ptst.flush()
+		assert os.path.getsize(filepath) == PointStore.HEADER_SIZE + 3 * 4 * 8
+		ptst.close()
+
+		ptst = PointStore(filepath, 4)
+		assert ptst.ncalls == 4, (ptst.ncalls)
+		assert ptst.pop(-np.inf)[1] is not None, "retrieving entry should succeed"
+		entry = ptst.pop(100)[1]
+		assert entry[1] == 156, ("retrieving entry should return correct value", entry)
+		ptst.close()
+
+		with pytest.raises(IOError):
+			ptst = PointStore(filepath, 3)
+
+		ptst = PointStore(filepath, 4, mode='w')
+		assert ptst.ncalls == 0, (ptst.ncalls)
+		assert ptst.stack_empty
+		ptst.close()
+	finally:
+		os.remove(filepath)
+
+
 def test_nullstore():
 	ptst = NullPointStore(4)
 	assert ptst.stack_empty
@@ -180,7 +289,7 @@ def test_nullstore():
 
 
 def test_storemany():
-	for PointStore in TextPointStore, HDF5PointStore:
+	for PointStore in TextPointStore, HDF5PointStore, BinaryPointStore:
 		for N in 1, 2, 10, 100:
 			print()
 			print("======== %s N=%d ========" % (PointStore, N))
@@ -242,3 +351,31 @@ def test_storemany():
 				ptst.close()
 			finally:
 				os.remove(filepath)
+
+def test_pointstack():
+	np.random.seed(1)
+	N = 1000
+	rows = np.random.normal(size=(N, 3))
+	rows[:,1] = rows[:,0] + np.random.exponential(size=N)
+	rows[:100,0] = -np.inf
+	rows[np.random.randint(N, size=10),1] = np.nan
+	stack = PointStack(rows, block_size=16)
+	reference = list(enumerate(rows))
+	assert len(stack) == N
+	for Lmin in np.append(-np.inf, np.random.normal(size=2000)):
+		expected = None, None
+		for i, (idx, row) in enumerate(reference):
+			if row[0] <= Lmin and row[1] > Lmin:
+				expected = reference.pop(i)
+				break
+		idx, row = stack.pop(Lmin)
+		assert idx == expected[0], (Lmin, idx, expected)
+		if idx is not None:
+			assert (row == expected[1]).all()
+		assert len(stack) == len(reference)
+	assert [idx for idx, _ in stack] == [idx for idx, _ in reference]
+	assert stack[-1][0] == reference[-1][0]
+
+	stack = PointStack(np.empty((0, 3)))
+	assert len(stack) == 0
+	assert stack.pop(-np.inf) == (None, None)
@@ -1,7 +1,8 @@
 import numpy as np
 import tempfile
+import pickle
 import os
-from ultranest.utils import vectorize, is_affine_transform, normalised_kendall_tau_distance
+from ultranest.utils import vectorize, is_affine_transform, normalised_kendall_tau_distance, LazyDict, SharedMemoryPool
 from numpy.testing import assert_allclose
 
 
@@ -19,6 +20,66 @@ def test_vectorize():
 	assert_allclose(np.array([myfunc(b[0]), myfunc(b[1])]), myvfunc(b))
 
 
+def test_lazydict():
+	ncalls = []
+	def compute():
+		ncalls.append(1)
+		return np.arange(3)
+	
+	d = LazyDict(a=1)
+	d.set_lazy('b', compute)
+	assert len(d) == 2
+	assert 'b' in d
+	assert len(ncalls) == 0
+	assert_allclose(d['b'], np.arange(3))
+	assert_allclose(d.get('b'), np.arange(3))
+	assert len(ncalls) == 1
+	
+	# converting computes pending entries
+	d = LazyDict(a=1)
+	d.set_lazy('b', compute)
+	assert sorted(dict(d).keys()) == ['a', 'b']
+	assert len(ncalls) == 2
+	d = LazyDict(a=1)
+	d.set_lazy('b', compute)
+	assert sorted(pickle.loads(pickle.dumps(d)).keys()) == ['a', 'b']
+	assert len(ncalls) == 3
+	
+	# overwriting and removing pending entries does not compute them
+	d = LazyDict(a=1)
+	d.set_lazy('b', compute)
+	d.set_lazy('c', compute)
+	d['b'] = 2
+	del d['c']
+	assert dict(d) == dict(a=1, b=2)
+	assert d.get('c', 3) == 3
+	assert len(ncalls) == 3
+
+
+def test_shared_memory_pool():
+	def loglike(x):
+		if not np.isfinite(x).all():
+			raise ValueError("not finite")
+		return -0.5 * (x**2).sum(axis=1)
+
+	pool = SharedMemoryPool(loglike, 3)
+	assert pool.__name__ == 'loglike'
+	for n in 1, 2, 10, 1000, 5:
+		x = np.random.normal(size=(n, 4))
+		assert_allclose(pool(x), loglike(x))
+	assert pool(np.empty((0, 4))).shape == (0,)
+	x[2,1] = np.nan
+	try:
+		pool(x)
+		assert False, "error in worker should propagate"
+	except ValueError:
+		pass
+	x = np.random.normal(size=(7, 4))
+	assert_allclose(pool(x), loglike(x))
+	pool.close()
+	assert not any(p.is_alive() for p in pool.processes)
+	pool.close()
+
 def test_is_affine_transform():
 	na = 2**np.random.randint(1, 10)
 	d = 2**np.random.randint(1, 3)
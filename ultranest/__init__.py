@@ -4,7 +4,7 @@ Some parts are from the Nestle library by Kyle Barbary (https://github.com/kbarb
 Some parts are from the nnest library by Adam Moss (https://github.com/adammoss/nnest)
 """
 
-from .integrator import NestedSampler, ReactiveNestedSampler, read_file
+from .integrator import NestedSampler, ReactiveNestedSampler, read_file, read_chain
 from .utils import vectorize
 
 
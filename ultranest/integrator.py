@@ -16,15 +16,15 @@ import warnings
 from numpy import log, exp, logaddexp
 import numpy as np
 
-from .utils import create_logger, make_run_dir, resample_equal, vol_prefactor, vectorize, listify as _listify, is_affine_transform, normalised_kendall_tau_distance
+from .utils import create_logger, make_run_dir, resample_equal, vol_prefactor, vectorize, vectorize_with_pool, SharedMemoryPool, listify as _listify, is_affine_transform, normalised_kendall_tau_distance, LazyDict
 from ultranest.mlfriends import MLFriends, AffineLayer, ScalingLayer, find_nearby, WrappingEllipsoid
-from .store import HDF5PointStore, TextPointStore, NullPointStore
+from .store import HDF5PointStore, TextPointStore, BinaryPointStore, NullPointStore, PointStack
 from .viz import get_default_viz_callback, nicelogger
 from .ordertest import UniformOrderAccumulator
-from .netiter import PointPile, SingleCounter, MultiCounter, BreadthFirstIterator, TreeNode, count_tree_between, find_nodes_before, logz_sequence
+from .netiter import PointPile, SingleCounter, MultiCounter, BreadthFirstIterator, TreeNode, ArrayTree, count_tree_between, find_nodes_before, logz_sequence
 from .netiter import dump_tree, combine_results
 
-__all__ = ['ReactiveNestedSampler', 'NestedSampler', 'read_file']
+__all__ = ['ReactiveNestedSampler', 'NestedSampler', 'read_file', 'read_chain']
 
 
 def _get_cumsum_range(pi, dp):
@@ -170,31 +170,18 @@ def resume_from_similar_file(log_dir, x_dim, loglikelihood, transform,
     del fileobj
 
     pointstore2 = HDF5PointStore(filepath2, ncols, mode='w')
-    stack = list(enumerate(points))
+    stack = PointStack(points)
 
     pointpile = PointPile(x_dim, num_params)
     pointpile2 = PointPile(x_dim, num_params)
+    pointpile.reserve(len(points))
+    pointpile2.reserve(len(points))
 
-    def pop(Lmin):
-        """ find matching sample from points file """
-        # look forward to see if there is an exact match
-        # if we do not use the exact matches
-        #   this causes a shift in the loglikelihoods
-        for i, (idx, next_row) in enumerate(stack):
-            row_Lmin = next_row[0]
-            L = next_row[1]
-            if row_Lmin <= Lmin and L > Lmin:
-                idx, row = stack.pop(i)
-                return idx, row
-        return None, None
-
-    roots = []
-    roots2 = []
     initial_points_u = []
     initial_points_v = []
     initial_points_logl = []
     while True:
-        _, row = pop(-np.inf)
+        _, row = stack.pop(-np.inf)
         if row is None:
             break
         logl = row[1]
@@ -203,14 +190,16 @@ def resume_from_similar_file(log_dir, x_dim, loglikelihood, transform,
         initial_points_u.append(u)
         initial_points_v.append(v)
         initial_points_logl.append(logl)
+    initial_points_u = np.reshape(initial_points_u, (-1, x_dim))
+    initial_points_v = np.reshape(initial_points_v, (-1, num_params))
 
     v2 = transform(np.array(initial_points_u, ndmin=2, dtype=float))
     assert np.allclose(v2, initial_points_v), 'transform inconsistent, cannot resume'
     logls_new = loglikelihood(v2)
 
-    for u, v, logl, logl_new in zip(initial_points_u, initial_points_v, initial_points_logl, logls_new):
-        roots.append(pointpile.make_node(logl, u, v))
-        roots2.append(pointpile2.make_node(logl_new, u, v))
+    roots = pointpile.make_nodes(initial_points_logl, initial_points_u, initial_points_v)
+    roots2 = pointpile2.make_nodes(logls_new, initial_points_u, initial_points_v)
+    for u, v, logl_new in zip(initial_points_u, initial_points_v, logls_new):
         pointstore2.add(_listify([-np.inf, logl_new, 0.0], u, v), 1)
 
     batchsize = ndraw
@@ -225,7 +214,7 @@ def resume_from_similar_file(log_dir, x_dim, loglikelihood, transform,
     last_good_state = 0
     epsilon = 1 + 1e-6
     niter = 0
-    for batch in _explore_iterator_batch(explorer, pop, x_dim, num_params, pointpile, batchsize=batchsize):
+    for batch in _explore_iterator_batch(explorer, stack.pop, x_dim, num_params, pointpile, batchsize=batchsize):
         assert len(batch) > 0
         batch_u = np.array([u for _, _, children in batch for u, _, _ in children], ndmin=2, dtype=float)
         if batch_u.size > 0:
@@ -321,6 +310,7 @@ def resume_from_similar_file(log_dir, x_dim, loglikelihood, transform,
             last_good_state + 1, len(points), (last_good_state + 1) * 100. / len(points)))
     # delete the ones at the end from last_good_state onwards
     # assert len(pointstore2.fileobj['points']) == niter, (len(pointstore2.fileobj['points']), niter)
+    pointstore2.flush()
     mask = pointstore2.fileobj['points'][:,0] <= last_good_like
     points2 = pointstore2.fileobj['points'][:][mask,:]
     del pointstore2.fileobj['points']
@@ -335,18 +325,46 @@ def resume_from_similar_file(log_dir, x_dim, loglikelihood, transform,
     os.replace(filepath2, filepath)
 
 
-def _update_region_bootstrap(region, nbootstraps, minvol=0., comm=None, mpi_size=1):
+def _update_region_bootstrap(region, nbootstraps, minvol=0., comm=None, mpi_size=1, num_threads=1):
     """
     update *region* with *nbootstraps* rounds of excluding points randomly.
     Stiffen ellipsoid size using the minimum volume *minvol*.
 
     If the mpi communicator *comm* is not None, use MPI to distribute
     the bootstraps over the *mpi_size* processes.
+
+    If there are more processes than bootstraps, every process
+    instead runs all bootstrap rounds on a block of the left-out
+    points, so that the nearest-neighbour distance computations
+    are split across processes by rows.
+
+    Within each process, the bootstraps are distributed over
+    *num_threads* threads.
     """
     assert nbootstraps > 0, nbootstraps
+    if comm is not None and mpi_size > nbootstraps:
+        # all processes need the same bootstrap selections
+        N = len(region.u)
+        if comm.Get_rank() == 0:
+            selections = [np.random.randint(N, size=N) for i in range(nbootstraps)]
+        else:
+            selections = None
+        selections = comm.bcast(selections, root=0)
+        r, f = region.compute_enlargement(
+            minvol=minvol, nbootstraps=nbootstraps, num_threads=num_threads,
+            selections=selections, rows=(comm.Get_rank(), mpi_size))
+        r = max(comm.allgather(r))
+        f = max(comm.allgather(f))
+        assert r > 0, r
+        assert f > 0, f
+        region.maxradiussq = r
+        region.enlarge = f
+        return r, f
+
     r, f = region.compute_enlargement(
         minvol=minvol,
-        nbootstraps=max(1, nbootstraps // mpi_size))
+        nbootstraps=max(1, nbootstraps // mpi_size),
+        num_threads=num_threads)
 
     if comm is not None:
         recv_maxradii = comm.gather(r, root=0)
@@ -364,6 +382,33 @@ def _update_region_bootstrap(region, nbootstraps, minvol=0., comm=None, mpi_size
     return r, f
 
 
+def _allgather_samples(comm, u, v, logl, nc):
+    """
+    exchange the samples *u*, *v*, *logl* of all processes of
+    the mpi communicator *comm*, and sum their number of
+    likelihood calls *nc*.
+
+    The samples are packed into a single buffer, which is exchanged
+    with one Allgatherv call after the buffer sizes are known.
+    As with gather, the samples are concatenated in the order
+    of the process ranks.
+    """
+    nu = len(logl)
+    xdim = np.shape(u)[1]
+    packed = np.empty((nu, 1 + xdim + np.shape(v)[1]))
+    packed[:,0] = logl
+    packed[:,1:1 + xdim] = u
+    packed[:,1 + xdim:] = v
+
+    recv_sizes = comm.allgather((nu, nc))
+    counts = [n * packed.shape[1] for n, _ in recv_sizes]
+    recv_packed = np.empty((sum(n for n, _ in recv_sizes), packed.shape[1]))
+    comm.Allgatherv(packed, [recv_packed, counts])
+    return (
+        recv_packed[:,1:1 + xdim], recv_packed[:,1 + xdim:], recv_packed[:,0],
+        sum(nc for _, nc in recv_sizes))
+
+
 class NestedSampler(object):
     """Simple Nested sampler for reference."""
 
@@ -776,8 +821,7 @@ class NestedSampler(object):
 
                     # if we keep the region informed about the new live points
                     # then the region follows the live points even if maxradius is not updated
-                    region.u[worst,:] = active_u[worst]
-                    region.unormed[worst,:] = region.transformLayer.transform(region.u[worst,:])
+                    region.replace_point(worst, active_u[worst])
 
                     # if we track the cluster assignment, then in the next round
                     # the ids with the same members are likely to have the same id
@@ -908,7 +952,16 @@ class ReactiveNestedSampler(object):
                  ndraw_min=128,
                  ndraw_max=65536,
                  storage_backend='hdf5',
+                 storage_options=None,
+                 chains_format='txt',
                  warmstart_max_tau=-1,
+                 num_threads=1,
+                 likelihood_pool=None,
+                 likelihood_pool_size=None,
+                 likelihood_pool_async=False,
+                 num_workers=1,
+                 max_cached_proposals=10000,
+                 debug=False,
                  ):
         """Initialise nested sampler.
 
@@ -976,12 +1029,84 @@ class ReactiveNestedSampler(object):
         storage_backend: str or class
             Class to use for storing the evaluated points (see ultranest.store)
             'hdf5' is strongly recommended. 'tsv' and 'csv' are also possible.
+            'bin' is a fast binary format, which does not need h5py.
+
+        storage_options: dict
+            Additional keyword arguments for the 'hdf5' storage backend,
+            see :py:class:`ultranest.store.HDF5PointStore`.
+            For example, buffer_size, flush_interval and compression.
+            When resuming large runs, lazy=True avoids loading all
+            stored points into memory.
+
+        chains_format: str
+            Format of the posterior chains written to the chains folder.
+            'txt' writes text files, one per table.
+            'npz' writes numpy .npz files, 'hdf5' writes all tables as
+            datasets into chains/chains.hdf5 (requires h5py).
+            The binary formats are much faster to write and read for
+            large runs. See :py:func:`read_chain` for loading them.
 
         warmstart_max_tau: float
             Maximum disorder to accept when resume='resume-similar';
             Live points are reused as long as the live point order 
             is below this normalised Kendall tau distance.
             Values from 0 (highly conservative) to 1 (extremely negligent).
+
+        num_threads: int
+            Number of threads to use for the MLFriends region bootstrap rounds.
+            Useful for speeding up region construction with many live points
+            on a multi-core machine, also without MPI.
+
+        likelihood_pool: None or concurrent.futures.Executor
+            Only used if vectorized is False.
+            If given, the executor is used to evaluate the likelihood,
+            for example a ProcessPoolExecutor (loglike then needs to be
+            picklable) or a ThreadPoolExecutor.
+            Batches of region proposals are then evaluated concurrently.
+            Useful for slow likelihood functions on a multi-core machine,
+            also without MPI.
+            The pool is not shut down by the sampler; use it as
+            a context manager around the run.
+
+        likelihood_pool_size: None or int
+            Number of proposals to evaluate concurrently in likelihood_pool.
+            Set this to the number of workers of the pool.
+            If None, the number of CPUs is used.
+
+        likelihood_pool_async: bool
+            If True, likelihood_pool is kept busy with
+            likelihood_pool_size region proposals, also across iterations,
+            instead of evaluating one batch at a time. A slow likelihood
+            evaluation then does not stall the others.
+            Results are used in the order they were submitted,
+            which keeps the sampling unbiased.
+            Only this process samples, the pool distributes the work.
+            For MPI, use a mpi4py.futures.MPIPoolExecutor, and start the
+            script with `mpiexec -n N python -m mpi4py.futures script.py`.
+            Other MPI processes than rank 0 running the sampler
+            raise a ValueError.
+            Step samplers do not use the pool asynchronously.
+
+        num_workers: int
+            If larger than 1, the likelihood is evaluated by this
+            number of worker processes on the same machine,
+            an alternative to MPI that needs no extra installation.
+            Each batch of points is split into one block per worker,
+            and exchanged with the workers through shared memory.
+            Where available, the workers are forked, so loglike does
+            not need to be picklable. Cannot be combined with
+            likelihood_pool. Requires Python 3.8 or newer.
+
+        max_cached_proposals: int
+            Maximum number of evaluated, but unused proposals to keep
+            when a new exploration pass starts. They are reused
+            at likelihood thresholds between the one they were drawn
+            from and their likelihood, saving likelihood evaluations
+            in improvement loops. Set to 0 to disable.
+
+        debug: bool
+            Perform additional, slow consistency checks in every iteration.
+            Useful when developing new region or step samplers.
         """
         self.paramnames = param_names
         x_dim = len(self.paramnames)
@@ -990,6 +1115,7 @@ class ReactiveNestedSampler(object):
         self.x_dim = x_dim
         self.derivedparamnames = derived_param_names
         self.num_bootstraps = int(num_bootstraps)
+        self.num_threads = int(num_threads)
         num_derived = len(self.derivedparamnames)
         self.num_params = x_dim + num_derived
         if wrapped_params is None:
@@ -1004,16 +1130,33 @@ class ReactiveNestedSampler(object):
             self.comm = MPI.COMM_WORLD
             self.mpi_size = self.comm.Get_size()
             self.mpi_rank = self.comm.Get_rank()
-            if self.mpi_size > 1:
+            if self.mpi_size > 1 and not likelihood_pool_async:
                 self.use_mpi = True
                 self._setup_distributed_seeds()
         except Exception:
             self.mpi_size = 1
             self.mpi_rank = 0
 
+        if likelihood_pool_async:
+            # the likelihood pool distributes the work
+            # (e.g., a MPIPoolExecutor), only this process samples.
+            # With mpi4py.futures, the other processes serve the pool
+            # and do not run the script. If they do, each would
+            # sample and write the same output files.
+            if self.mpi_rank != 0:
+                raise ValueError(
+                    "likelihood_pool_async: only MPI rank 0 should run the sampler "
+                    "(this is rank %d of %d). Start the script with "
+                    "`mpiexec -n N python -m mpi4py.futures script.py`, "
+                    "or without mpiexec." % (self.mpi_rank, self.mpi_size))
+            self.mpi_size = 1
+
         self.log = self.mpi_rank == 0
         self.log_to_disk = self.log and log_dir is not None
         self.log_to_pointstore = self.log_to_disk
+        assert chains_format in ('txt', 'npz', 'hdf5'), \
+            "chains_format should be one of 'txt', 'npz' or 'hdf5'"
+        self.chains_format = chains_format
 
         assert resume in (True, 'overwrite', 'subfolder', 'resume', 'resume-similar'), \
             "resume should be one of 'overwrite' 'subfolder', 'resume' or 'resume-similar'"
@@ -1034,6 +1177,8 @@ class ReactiveNestedSampler(object):
                 num_bootstraps, ndraw_min, ndraw_max,
             ))
         self.root = TreeNode(id=-1, value=-np.inf)
+        # leaves replaced in a batch together with the next expanded node
+        self.deferred_node_ids = set()
 
         self.pointpile = PointPile(self.x_dim, self.num_params)
         if self.log_to_pointstore:
@@ -1046,7 +1191,11 @@ class ReactiveNestedSampler(object):
                 self.pointstore = TextPointStore(storage_filename, storage_num_cols)
                 self.pointstore.delimiter = ','
             elif storage_backend == 'hdf5':
-                self.pointstore = HDF5PointStore(storage_filename, storage_num_cols, mode='a' if resume else 'w')
+                self.pointstore = HDF5PointStore(
+                    storage_filename, storage_num_cols, mode='a' if resume else 'w',
+                    **(storage_options or {}))
+            elif storage_backend == 'bin':
+                self.pointstore = BinaryPointStore(storage_filename, storage_num_cols, mode='a' if resume else 'w')
             else:
                 # use custom backend
                 self.pointstore = storage_backend
@@ -1055,11 +1204,35 @@ class ReactiveNestedSampler(object):
         self.ncall = self.pointstore.ncalls
         self.ncall_region = 0
 
+        # number of proposals to evaluate at once, if draw_multiple is False
+        self.ndraw_single = 1
+        assert not likelihood_pool_async or (likelihood_pool is not None and not vectorized), \
+            "likelihood_pool_async requires a likelihood_pool, and vectorized=False"
+        self.likelihood_pool_async = likelihood_pool_async
+        # the pool, the (single point) likelihood and the region proposals
+        # under evaluation, as (future, u, v, Lmin) tuples in submission order
+        self.likelihood_pool = likelihood_pool
+        self._pool_loglike = loglike
+        self._proposals_in_flight = []
         if not vectorized:
             if transform is not None:
                 transform = vectorize(transform)
-            loglike = vectorize(loglike)
+            if likelihood_pool is None:
+                loglike = vectorize(loglike)
+            else:
+                self.ndraw_single = int(likelihood_pool_size or os.cpu_count())
+                loglike = vectorize_with_pool(loglike, likelihood_pool)
             draw_multiple = False
+        self.num_workers = int(num_workers)
+        self.loglike_workers = None
+        if self.num_workers > 1:
+            assert likelihood_pool is None, "num_workers cannot be combined with likelihood_pool"
+            if not vectorized:
+                # give each worker one point per batch
+                self.ndraw_single = self.num_workers
+            # the workers are stopped when the sampler is garbage collected,
+            # or by calling self.loglike_workers.close()
+            self.loglike_workers = loglike = SharedMemoryPool(loglike, self.num_workers)
 
         self.draw_multiple = draw_multiple
         self.ndraw_min = ndraw_min
@@ -1082,12 +1255,22 @@ class ReactiveNestedSampler(object):
                     max_tau=warmstart_max_tau, verbose=False)
                 self.pointstore = HDF5PointStore(
                     os.path.join(self.logs['results'], 'points.hdf5'),
-                    3 + self.x_dim + self.num_params, mode='a' if resume else 'w')
+                    3 + self.x_dim + self.num_params, mode='a' if resume else 'w',
+                    **(storage_options or {}))
             elif resume:
                 raise Exception("Cannot resume because loglikelihood function changed, "
                                 "unless resume=resume-similar. To start from scratch, delete '%s'." % (log_dir))
         self._set_likelihood_function(transform, loglike, num_test_samples)
         self.stepsampler = None
+        self.debug = debug
+        # whether the live points were checked to be inside the current region
+        self.region_checked = False
+        # proposal buffer and the likelihood threshold it was drawn from
+        self.ib = 0
+        self.samples = []
+        self.samples_Lmin = -np.inf
+        self.max_cached_proposals = int(max_cached_proposals)
+        self.proposal_cache = PointStack(np.empty((0, 2 + self.x_dim + self.num_params)))
 
     def _setup_distributed_seeds(self):
         if not self.use_mpi:
@@ -1353,7 +1536,7 @@ class ReactiveNestedSampler(object):
             active_v = prev_v
             active_logl = prev_logl
 
-        roots = [self.pointpile.make_node(logl, u, p) for u, p, logl in zip(active_u, active_v, active_logl)]
+        roots = self.pointpile.make_nodes(active_logl, active_u, active_v)
         if len(active_u) > 4:
             self.build_tregion = not is_affine_transform(active_u, active_v)
         self.root.children += roots
@@ -1536,29 +1719,23 @@ class ReactiveNestedSampler(object):
             v = np.empty((0, self.num_params))
             logl = np.empty((0,))
         else:
+            # step samplers return a single point,
+            # population step samplers may return several
             assert np.logical_and(u > 0, u < 1).all(), (u)
-            u = u.reshape((1, self.x_dim))
-            v = v.reshape((1, self.num_params))
-            logl = logl.reshape((1,))
+            u = u.reshape((-1, self.x_dim))
+            v = v.reshape((-1, self.num_params))
+            logl = logl.reshape((-1,))
 
         if self.use_mpi:
-            recv_samples = self.comm.gather(u, root=0)
-            recv_samplesv = self.comm.gather(v, root=0)
-            recv_likes = self.comm.gather(logl, root=0)
-            recv_nc = self.comm.gather(nc, root=0)
-            recv_samples = self.comm.bcast(recv_samples, root=0)
-            recv_samplesv = self.comm.bcast(recv_samplesv, root=0)
-            recv_likes = self.comm.bcast(recv_likes, root=0)
-            recv_nc = self.comm.bcast(recv_nc, root=0)
-            self.samples = np.concatenate(recv_samples, axis=0)
-            self.samplesv = np.concatenate(recv_samplesv, axis=0)
-            self.likes = np.concatenate(recv_likes, axis=0)
-            self.ncall += sum(recv_nc)
+            self.samples, self.samplesv, self.likes, recv_nc = _allgather_samples(
+                self.comm, u, v, logl, nc)
+            self.ncall += recv_nc
         else:
             self.samples = u
             self.samplesv = v
             self.likes = logl
             self.ncall += nc
+        self.samples_Lmin = Lmin
         self.ncall_region += ndraw
 
         if self.log:
@@ -1568,41 +1745,92 @@ class ReactiveNestedSampler(object):
                     _listify([Lmin, logli, quality], ui, vi),
                     self.ncall)
 
+    def _submit_proposals_async(self, Lmin, ndraw):
+        """Keep `ndraw_single` region proposals under evaluation in likelihood_pool."""
+        nrunning = sum(not future.done() for future, _, _, _ in self._proposals_in_flight)
+        if nrunning >= self.ndraw_single:
+            return
+        u, _ = self.region.sample(nsamples=max(ndraw, self.ndraw_single))
+        assert np.logical_and(u > 0, u < 1).all(), (u)
+        u = u[:self.ndraw_single - nrunning,:]
+        if len(u) == 0:
+            return
+        v = self.transform(u)
+        if self.tregion is not None:
+            # check wrapping ellipsoid in transformed space
+            inside = self.tregion.inside(v)
+            u = u[inside,:]
+            v = v[inside,:]
+        for ui, vi in zip(u, v):
+            future = self.likelihood_pool.submit(self._pool_loglike, vi)
+            self._proposals_in_flight.append((future, ui, vi, Lmin))
+
+    def _collect_proposals_async(self, wait_all=False):
+        """Collect evaluated proposals from likelihood_pool.
+
+        Waits for the oldest proposal, and also takes the following ones
+        that are finished. Taking the results in the order of submission,
+        rather than as they finish, avoids favoring the proposals
+        with fast likelihood evaluations. If `wait_all`, waits for all.
+
+        Returns u, v, logl and the thresholds the proposals were drawn at.
+        """
+        in_flight = self._proposals_in_flight
+        n = len(in_flight) if wait_all else min(1, len(in_flight))
+        while n < len(in_flight) and in_flight[n][0].done():
+            n += 1
+        done = in_flight[:n]
+        del in_flight[:n]
+        u = np.array([ui for _, ui, _, _ in done]).reshape((-1, self.x_dim))
+        v = np.array([vi for _, _, vi, _ in done]).reshape((-1, self.num_params))
+        logl = np.array([float(future.result()) for future, _, _, _ in done])
+        Lmins = np.array([Lmin for _, _, _, Lmin in done])
+        return u, v, logl, Lmins
+
     def _refill_samples(self, Lmin, ndraw, nit):
         """Get new samples from region."""
         nc = 0
-        u, father = self.region.sample(nsamples=ndraw)
-        assert np.logical_and(u > 0, u < 1).all(), (u)
-        nu = u.shape[0]
-        if nu == 0:
-            v = np.empty((0, self.num_params))
-            logl = np.empty((0,))
-            accepted = np.empty(0, dtype=bool)
+        if self.likelihood_pool_async:
+            self._submit_proposals_async(Lmin, ndraw)
+            # proposals drawn at this or lower thresholds are
+            # uniformly distributed above Lmin, if they exceed it
+            u, v, logl, _ = self._collect_proposals_async()
+            nc = len(logl)
+            accepted = logl > Lmin
         else:
-            if nu > 1 and not self.draw_multiple:
-                # peel off first if multiple evaluation is not supported
-                nu = 1
-                u = u[:1,:]
-                father = father[:1]
-
-            v = self.transform(u)
-            logl = np.ones(nu) * -np.inf
-
-            if self.tregion is not None:
-                # check wrapping ellipsoid in transformed space
-                accepted = self.tregion.inside(v)
-                nt = accepted.sum()
+            u, father = self.region.sample(nsamples=ndraw)
+            assert np.logical_and(u > 0, u < 1).all(), (u)
+            nu = u.shape[0]
+            if nu == 0:
+                v = np.empty((0, self.num_params))
+                logl = np.empty((0,))
+                accepted = np.empty(0, dtype=bool)
             else:
-                # if undefined, all pass; rarer branch
-                accepted = np.ones(nu, dtype=bool)
-                nt = nu
+                if nu > self.ndraw_single and not self.draw_multiple:
+                    # peel off first if multiple evaluation is not supported
+                    # (or only as many as there are likelihood workers)
+                    nu = self.ndraw_single
+                    u = u[:nu,:]
+                    father = father[:nu]
+
+                v = self.transform(u)
+                logl = np.ones(nu) * -np.inf
+
+                if self.tregion is not None:
+                    # check wrapping ellipsoid in transformed space
+                    accepted = self.tregion.inside(v)
+                    nt = accepted.sum()
+                else:
+                    # if undefined, all pass; rarer branch
+                    accepted = np.ones(nu, dtype=bool)
+                    nt = nu
 
-            if nt > 0:
-                logl[accepted] = self.loglike(v[accepted, :])
-                nc += nt
-            accepted = logl > Lmin
+                if nt > 0:
+                    logl[accepted] = self.loglike(v[accepted, :])
+                    nc += nt
+                accepted = logl > Lmin
 
-            # print("it: %4d ndraw: %d -> %d -> %d -> %d " % (nit, ndraw, nu, nt, accepted.sum()))
+                # print("it: %4d ndraw: %d -> %d -> %d -> %d " % (nit, ndraw, nu, nt, accepted.sum()))
 
         if not self.sampling_slow_warned and nit * ndraw >= 100000 and nit > 20:
             warning_message1 = ("Sampling from region seems inefficient (%d/%d accepted in iteration %d). " % (accepted.sum(), ndraw, nit))
@@ -1637,29 +1865,59 @@ class ReactiveNestedSampler(object):
         logl = logl[accepted]
 
         if self.use_mpi:
-            recv_samples = self.comm.gather(u, root=0)
-            recv_samplesv = self.comm.gather(v, root=0)
-            recv_likes = self.comm.gather(logl, root=0)
-            recv_nc = self.comm.gather(nc, root=0)
-            recv_samples = self.comm.bcast(recv_samples, root=0)
-            recv_samplesv = self.comm.bcast(recv_samplesv, root=0)
-            recv_likes = self.comm.bcast(recv_likes, root=0)
-            recv_nc = self.comm.bcast(recv_nc, root=0)
-            self.samples = np.concatenate(recv_samples, axis=0)
-            self.samplesv = np.concatenate(recv_samplesv, axis=0)
-            self.likes = np.concatenate(recv_likes, axis=0)
-            self.ncall += sum(recv_nc)
+            self.samples, self.samplesv, self.likes, recv_nc = _allgather_samples(
+                self.comm, u, v, logl, nc)
+            self.ncall += recv_nc
         else:
             self.samples = np.array(u)
             self.samplesv = np.array(v)
             self.likes = np.array(logl)
             self.ncall += nc
+        self.samples_Lmin = Lmin
         self.ncall_region += ndraw
 
         if self.log:
             for ui, vi, logli in zip(self.samples, self.samplesv, self.likes):
                 self.pointstore.add(_listify([Lmin, logli, 0.0], ui, vi), self.ncall)
 
+    def _cache_unused_proposals(self):
+        """Keep the not yet used proposals for the next exploration pass.
+
+        The proposals were drawn above the likelihood threshold
+        `self.samples_Lmin`, so they remain valid draws for any higher
+        threshold below their likelihood. At most `max_cached_proposals`
+        proposals, the most recent ones, are kept. This includes the
+        proposals still under evaluation, with `likelihood_pool_async`.
+
+        Only the proposals of the preceding pass are kept. Cached
+        proposals which were not used in that pass are discarded:
+        they are mostly low-likelihood proposals from older, larger
+        regions, and reusing them would bias later draws.
+        """
+        # proposals under evaluation may have been drawn above
+        # where the next pass starts, so they are collected here
+        u, v, logl, Lmins = self._collect_proposals_async(wait_all=True)
+        self.ncall += len(logl)
+        valid = logl > Lmins
+        if self.log:
+            for Lmini, logli, ui, vi in zip(Lmins[valid], logl[valid], u[valid], v[valid]):
+                self.pointstore.add(_listify([Lmini, logli, 0.0], ui, vi), self.ncall)
+
+        # drop the proposals cached for the previous pass
+        self.proposal_cache = PointStack(np.empty((0, 2 + self.x_dim + self.num_params)))
+        if self.max_cached_proposals <= 0:
+            return
+        rows = [np.hstack((
+            Lmins[valid].reshape((-1, 1)), logl[valid].reshape((-1, 1)), u[valid], v[valid]))]
+        nleft = len(self.samples) - self.ib
+        if nleft > 0:
+            rows.append(np.hstack((
+                np.ones((nleft, 1)) * self.samples_Lmin,
+                np.reshape(self.likes[self.ib:], (nleft, 1)),
+                self.samples[self.ib:], self.samplesv[self.ib:])))
+        rows = np.concatenate(rows, axis=0)[-self.max_cached_proposals:]
+        self.proposal_cache = PointStack(rows)
+
     def _create_point(self, Lmin, ndraw, active_u, active_values):
         """Draw a new point above likelihood threshold `Lmin`.
 
@@ -1695,15 +1953,30 @@ class ReactiveNestedSampler(object):
                     next_point = self.comm.bcast(next_point, root=0)
 
                 # unpack
+                self.samples_Lmin = next_point[0,0]
                 self.likes = next_point[:,1]
                 self.samples = next_point[:,3:3 + self.x_dim]
                 self.samplesv = next_point[:,3 + self.x_dim:3 + self.x_dim + self.num_params]
                 # skip if we already know it is not useful
                 ib = 0 if np.isfinite(self.likes[0]) else 1
 
-            assert self.region.inside(active_u).any(), \
-                ("None of the live points satisfies the current region!",
-                 self.region.maxradiussq, self.region.u, self.region.unormed, active_u)
+            if ib >= len(self.samples) and len(self.proposal_cache) > 0:
+                # reuse a proposal left over from a previous exploration pass
+                _, cached_point = self.proposal_cache.pop(Lmin)
+                if cached_point is not None:
+                    self.samples_Lmin = cached_point[0]
+                    self.likes = cached_point[1:2]
+                    self.samples = cached_point[None, 2:2 + self.x_dim]
+                    self.samplesv = cached_point[None, 2 + self.x_dim:]
+                    ib = 0
+
+            if self.debug or not self.region_checked:
+                # the region follows the live points, so it only needs
+                # to be checked when it was updated
+                assert self.region.inside(active_u).any(), \
+                    ("None of the live points satisfies the current region!",
+                     self.region.maxradiussq, self.region.u, self.region.unormed, active_u)
+                self.region_checked = True
             if self.stepsampler is None:
                 while ib >= len(self.samples):
                     ib = 0
@@ -1777,7 +2050,9 @@ class ReactiveNestedSampler(object):
             self.region_nodes = active_node_ids.copy()
             assert self.region.maxradiussq is None
 
-            _update_region_bootstrap(self.region, nbootstraps, minvol, self.comm if self.use_mpi else None, self.mpi_size)
+            _update_region_bootstrap(
+                self.region, nbootstraps, minvol, self.comm if self.use_mpi else None, self.mpi_size,
+                num_threads=self.num_threads)
             self.region.create_ellipsoid(minvol=minvol)
             # if self.log:
             #     self.logger.debug("building first region ... r=%e, f=%e" % (r, f))
@@ -1800,7 +2075,9 @@ class ReactiveNestedSampler(object):
             self.region_nodes = active_node_ids.copy()
             self.region.set_transformLayer(self.transformLayer)
 
-            _update_region_bootstrap(self.region, nbootstraps, minvol, self.comm if self.use_mpi else None, self.mpi_size)
+            _update_region_bootstrap(
+                self.region, nbootstraps, minvol, self.comm if self.use_mpi else None, self.mpi_size,
+                num_threads=self.num_threads)
 
             # print("made first region, r=%e" % (r))
 
@@ -1867,7 +2144,9 @@ class ReactiveNestedSampler(object):
 
                 # if self.log:
                 #     self.logger.info("computing maxradius...")
-                r, f = _update_region_bootstrap(nextregion, nbootstraps, minvol, self.comm if self.use_mpi else None, self.mpi_size)
+                r, f = _update_region_bootstrap(
+                    nextregion, nbootstraps, minvol, self.comm if self.use_mpi else None, self.mpi_size,
+                    num_threads=self.num_threads)
                 # verify correctness:
                 nextregion.create_ellipsoid(minvol=minvol)
 
@@ -1912,6 +2191,8 @@ class ReactiveNestedSampler(object):
                     self.logger.debug("not updating region", exc_info=True)
 
         assert len(self.region.u) == len(self.transformLayer.clusterids)
+        if updated:
+            self.region_checked = False
 
         if active_p is None or not self.build_tregion:
             self.tregion = None
@@ -2065,6 +2346,7 @@ class ReactiveNestedSampler(object):
             cluster_num_live_points=40,
             insertion_test_window=10,
             insertion_test_zscore_threshold=2,
+            replace_batch_size=1,
     ):
         """Run until target convergence criteria are fulfilled.
 
@@ -2133,6 +2415,21 @@ class ReactiveNestedSampler(object):
         insertion_test_window: float
             Number of iterations after which the insertion order test is reset.
 
+        replace_batch_size: int
+            Number of lowest live points to replace together.
+            With values above 1, the k lowest live points are removed first,
+            and then k new points are sampled above the highest of them,
+            as in parallel nested sampling. The shrinkage of the volume
+            is accounted for by the tree. This reduces the per-iteration
+            overhead when many points are proposed at once,
+            for example with vectorized likelihoods.
+            Removed points wait to be replaced at the next node which is
+            expanded. If the exploration stops before, they are not
+            replaced, and the number of live points decreases there.
+            Keep this well below the number of live points: the new points
+            all descend from one node, which makes the bootstrapped
+            uncertainty estimates noisier.
+
         """
 
         for result in self.run_iter(
@@ -2149,6 +2446,7 @@ class ReactiveNestedSampler(object):
             viz_callback=viz_callback,
             insertion_test_window=insertion_test_window,
             insertion_test_zscore_threshold=insertion_test_zscore_threshold,
+            replace_batch_size=replace_batch_size,
         ):
             if self.log:
                 self.logger.debug("did a run_iter pass!")
@@ -2177,6 +2475,7 @@ class ReactiveNestedSampler(object):
             viz_callback='auto',
             insertion_test_window=10,
             insertion_test_zscore_threshold=2,
+            replace_batch_size=1,
     ):
         """Iterate towards convergence.
 
@@ -2185,6 +2484,10 @@ class ReactiveNestedSampler(object):
             for result in sampler.run_iter(...):
                 print('lnZ = %(logz).2f +- %(logzerr).2f' % result)
 
+        The posterior samples and summaries, and the insertion order test
+        of each result are computed when first accessed, so that
+        intermediate results are cheap if they are not written to disk.
+
         Parameters as described in run() method.
         """
         # frac_remain=1  means 1:1 -> dlogz=log(0.5)
@@ -2202,6 +2505,7 @@ class ReactiveNestedSampler(object):
         else:
             self.use_point_stack = False
 
+        assert replace_batch_size >= 1, replace_batch_size
         assert min_num_live_points >= cluster_num_live_points, \
             ('min_num_live_points(%d) cannot be less than cluster_num_live_points(%d)' %
                 (min_num_live_points, cluster_num_live_points))
@@ -2238,6 +2542,7 @@ class ReactiveNestedSampler(object):
             )
 
         self.results = None
+        npoints_expected = max_iters or 0
 
         while True:
             roots = self.root.children
@@ -2254,13 +2559,19 @@ class ReactiveNestedSampler(object):
                 if log_interval < 1:
                     raise ValueError("log_interval must be >= 1")
 
+            # make space for the new points at once,
+            # expecting as many as in the previous exploration
+            self.pointpile.reserve(self.pointpile.nrows + npoints_expected)
+            npoints_at_pass_start = self.pointpile.nrows
+
             explorer = BreadthFirstIterator(roots)
             # Integrating thing
             main_iterator = MultiCounter(
                 nroots=len(roots),
                 nbootstraps=max(1, self.num_bootstraps // self.mpi_size),
-                random=False, check_insertion_order=False)
+                random=False, check_insertion_order=False, incremental=True)
             main_iterator.Lmax = max(Lmax, max(n.value for n in roots))
+            main_iterator.deferred_node_ids = self.deferred_node_ids
             insertion_test = UniformOrderAccumulator(nroots)
             insertion_test_runs = []
             insertion_test_quality = np.inf
@@ -2271,6 +2582,7 @@ class ReactiveNestedSampler(object):
             self.tregion = None
             self.live_points_healthy = True
             it_at_first_region = 0
+            self._cache_unused_proposals()
             self.ib = 0
             self.samples = []
             if self.draw_multiple:
@@ -2299,6 +2611,9 @@ class ReactiveNestedSampler(object):
             ncall_region_at_run_start = self.ncall_region
             next_update_interval_volume = 1
             last_status = time.time()
+            # nodes removed from the live points, which are waiting
+            # to be replaced together with the next expanded node
+            deferred_node_ids = []
 
             # we go through each live point (regardless of root) by likelihood value
             while True:
@@ -2325,14 +2640,32 @@ class ReactiveNestedSampler(object):
                     target_min_num_children, node, active_values,
                     max_ncalls, max_iters, self.live_points_healthy)
 
+                # parallel nested sampling: remove the k lowest live points
+                # and replace them together, above the highest of them.
+                # until then, the removed nodes are leaves, so the
+                # volume shrinks as if the number of live points decreases.
+                # No batch is started when the region is due to be rebuilt,
+                # because the region has to track the replaced nodes.
+                defer_node = (
+                    expand_node and replace_batch_size > 1 and len(node.children) == 0 and
+                    len(deferred_node_ids) < replace_batch_size - 1 and
+                    len(active_values) > replace_batch_size and
+                    self.region is not None and
+                    not main_iterator.logVolremaining < next_update_interval_volume)
+
                 region_fresh = False
-                if expand_node:
+                if defer_node:
+                    deferred_node_ids.append(node.id)
+                    main_iterator.deferred_node_ids.add(node.id)
+                elif expand_node:
                     # sample a new point above Lmin
                     active_u = self.pointpile.getu(active_node_ids)
                     active_p = self.pointpile.getp(active_node_ids)
                     nlive = len(active_u)
                     # first we check that the region is up-to-date
-                    if main_iterator.logVolremaining < next_update_interval_volume:
+                    # a pending batch is replaced first, with the region
+                    # that still tracks the deferred nodes
+                    if main_iterator.logVolremaining < next_update_interval_volume and not deferred_node_ids:
                         if self.region is None:
                             it_at_first_region = it
                         region_fresh = self._update_region(
@@ -2382,42 +2715,49 @@ class ReactiveNestedSampler(object):
                                 cluster_num_live_points * nclusters)
                         break
 
-                    # sample point
-                    u, p, L = self._create_point(Lmin=Lmin, ndraw=ndraw, active_u=active_u, active_values=active_values)
-                    child = self.pointpile.make_node(L, u, p)
-                    main_iterator.Lmax = max(main_iterator.Lmax, L)
-                    if np.isfinite(insertion_test_zscore_threshold) and nlive > 1:
-                        insertion_test.add((active_values < L).sum(), nlive)
-                        if abs(insertion_test.zscore) > insertion_test_zscore_threshold:
-                            insertion_test_runs.append(insertion_test.N)
-                            insertion_test_quality = insertion_test.N
-                            insertion_test_direction = np.sign(insertion_test.zscore)
-                            insertion_test.reset()
-                        elif insertion_test.N > nlive * insertion_test_window:
-                            insertion_test_quality = np.inf
-                            insertion_test_direction = 0
-                            insertion_test.reset()
-
-                    # identify which point is being replaced (from when we built the region)
-                    worst = np.where(self.region_nodes == node.id)[0]
-                    self.region_nodes[worst] = child.id
-                    # if we keep the region informed about the new live points
-                    # then the region follows the live points even if maxradius is not updated
-                    self.region.u[worst] = u
-                    self.region.unormed[worst] = self.region.transformLayer.transform(u)
-                    # move also the ellipsoid
-                    self.region.ellipsoid_center = np.mean(self.region.u, axis=0)
-                    if self.tregion:
-                        self.tregion.ellipsoid_center = np.mean(active_p, axis=0)
-
-                    # if we track the cluster assignment, then in the next round
-                    # the ids with the same members are likely to have the same id
-                    # this is imperfect
-                    # transformLayer.clusterids[worst] = transformLayer.clusterids[father[ib]]
-                    # so we just mark the replaced ones as "unassigned"
-                    self.transformLayer.clusterids[worst] = 0
-
-                    node.children.append(child)
+                    # sample points, one for each removed node
+                    replaced_node_ids = deferred_node_ids + [node.id]
+                    new_u, new_p, new_L = [], [], []
+                    for _ in replaced_node_ids:
+                        u, p, L = self._create_point(Lmin=Lmin, ndraw=ndraw, active_u=active_u, active_values=active_values)
+                        new_u.append(u)
+                        new_p.append(p)
+                        new_L.append(L)
+                        main_iterator.Lmax = max(main_iterator.Lmax, L)
+                        if np.isfinite(insertion_test_zscore_threshold) and nlive > 1:
+                            insertion_test.add((active_values < L).sum(), nlive)
+                            if abs(insertion_test.zscore) > insertion_test_zscore_threshold:
+                                insertion_test_runs.append(insertion_test.N)
+                                insertion_test_quality = insertion_test.N
+                                insertion_test_direction = np.sign(insertion_test.zscore)
+                                insertion_test.reset()
+                            elif insertion_test.N > nlive * insertion_test_window:
+                                insertion_test_quality = np.inf
+                                insertion_test_direction = 0
+                                insertion_test.reset()
+
+                    children = self.pointpile.make_nodes(new_L, np.array(new_u), np.array(new_p))
+                    for replaced_node_id, child, u in zip(replaced_node_ids, children, new_u):
+                        # identify which point is being replaced (from when we built the region)
+                        worst = np.where(self.region_nodes == replaced_node_id)[0]
+                        self.region_nodes[worst] = child.id
+                        # if we keep the region informed about the new live points
+                        # then the region follows the live points even if maxradius is not updated
+                        # and move also the ellipsoid
+                        for i in worst:
+                            self.region.replace_point(i, u)
+                        if self.tregion:
+                            self.tregion.ellipsoid_center = np.mean(active_p, axis=0)
+
+                        # if we track the cluster assignment, then in the next round
+                        # the ids with the same members are likely to have the same id
+                        # this is imperfect
+                        # transformLayer.clusterids[worst] = transformLayer.clusterids[father[ib]]
+                        # so we just mark the replaced ones as "unassigned"
+                        self.transformLayer.clusterids[worst] = 0
+
+                        node.children.append(child)
+                    deferred_node_ids = []
 
                     if self.log and (region_fresh or it % log_interval == 0 or time.time() > last_status + 0.1):
                         last_status = time.time()
@@ -2473,7 +2813,7 @@ class ReactiveNestedSampler(object):
 
                 # inform iterators (if it is their business) about the arc
                 main_iterator.passing_node(rootid, node, active_rootids, active_values)
-                if len(node.children) == 0 and self.region is not None:
+                if len(node.children) == 0 and self.region is not None and not defer_node:
                     # the region radius needs to increase if nlive decreases
                     # radius is not reliable, so set to inf
                     # (heuristics do not work in practice)
@@ -2486,6 +2826,7 @@ class ReactiveNestedSampler(object):
 
             if self.log:
                 self.logger.info("Explored until L=%.1g  ", node.value)
+            npoints_expected = self.pointpile.nrows - npoints_at_pass_start
             # print_tree(roots[::10])
 
             self.pointstore.flush()
@@ -2581,54 +2922,104 @@ class ReactiveNestedSampler(object):
         results['paramnames'] = self.paramnames
         results['logzerr_single'] = (main_iterator.all_H[0] / self.min_num_live_points)**0.5
 
-        sequence, results2 = logz_sequence(self.root, self.pointpile, random=True, check_insertion_order=True)
-        results['insertion_order_MWW_test'] = results2['insertion_order_MWW_test']
+        # exploring the tree again is only done when its results are needed.
+        # the tree grows in later passes, but nodes added later have
+        # higher ids, so the current state can be recovered then
+        nnodes = self.pointpile.nrows
+        deferred_node_ids = frozenset(self.deferred_node_ids)
 
-        results_simple = dict(results)
-        weighted_samples = results_simple.pop('weighted_samples')
-        samples = results_simple.pop('samples')
-        saved_wt0 = weighted_samples['weights']
-        saved_u = weighted_samples['upoints']
-        saved_v = weighted_samples['points']
+        def compute_sequence():
+            tree = ArrayTree.from_roots(self.root.children)
+            root = TreeNode(id=-1, value=-np.inf, children=tree.to_roots(keep=tree.ids < nnodes))
+            return logz_sequence(
+                root, self.pointpile, random=True, check_insertion_order=True,
+                deferred_node_ids=deferred_node_ids)
 
-        if self.log_to_disk:
-            if self.log:
-                self.logger.info("Writing samples and results to disk ...")
-            np.savetxt(os.path.join(self.logs['chains'], 'equal_weighted_post.txt'),
-                       samples,
-                       header=' '.join(self.paramnames + self.derivedparamnames),
-                       comments='')
-            np.savetxt(os.path.join(self.logs['chains'], 'weighted_post.txt'),
-                       np.hstack((saved_wt0.reshape((-1, 1)), np.reshape(saved_logl, (-1, 1)), saved_v)),
-                       header=' '.join(['weight', 'logl'] + self.paramnames + self.derivedparamnames),
-                       comments='')
-            np.savetxt(os.path.join(self.logs['chains'], 'weighted_post_untransformed.txt'),
-                       np.hstack((saved_wt0.reshape((-1, 1)), np.reshape(saved_logl, (-1, 1)), saved_u)),
-                       header=' '.join(['weight', 'logl'] + self.paramnames + self.derivedparamnames),
-                       comments='')
-
-            with open(os.path.join(self.logs['info'], 'results.json'), 'w') as f:
-                json.dump(results_simple, f, indent=4)
-
-            np.savetxt(
-                os.path.join(self.logs['info'], 'post_summary.csv'),
-                [np.hstack([results['posterior'][k] for k in ('mean', 'stdev', 'median', 'errlo', 'errup')])],
-                header=', '.join(['"{0}_mean", "{0}_stdev", "{0}_median", "{0}_errlo", "{0}_errup"'.format(k)
-                                  for k in self.paramnames + self.derivedparamnames]),
-                delimiter=',', comments='',
-            )
+        run_sequence = LazyDict()
+        run_sequence.set_lazy('sequence', compute_sequence)
+        results.set_lazy('insertion_order_MWW_test', lambda: run_sequence['sequence'][1]['insertion_order_MWW_test'])
 
         if self.log_to_disk:
-            keys = 'logz', 'logzerr', 'logvol', 'nlive', 'logl', 'logwt', 'insert_order'
-            np.savetxt(os.path.join(self.logs['chains'], 'run.txt'),
-                       np.hstack(tuple([np.reshape(sequence[k], (-1, 1)) for k in keys])),
-                       header=' '.join(keys),
-                       comments='')
-            if self.log:
-                self.logger.info("Writing samples and results to disk ... done")
+            saved_wt0 = results['weighted_samples']['weights']
+            saved_u = results['weighted_samples']['upoints']
+            saved_v = results['weighted_samples']['points']
+            self._write_chain(
+                'weighted_post', ['weight', 'logl'] + self.paramnames + self.derivedparamnames,
+                np.hstack((saved_wt0.reshape((-1, 1)), np.reshape(saved_logl, (-1, 1)), saved_v)))
+            self._write_chain(
+                'weighted_post_untransformed', ['weight', 'logl'] + self.paramnames,
+                np.hstack((saved_wt0.reshape((-1, 1)), np.reshape(saved_logl, (-1, 1)), saved_u)))
 
         self.results = results
-        self.run_sequence = sequence
+        self._run_sequence = run_sequence
+        if self.log_to_disk:
+            self._write_results()
+
+    @property
+    def run_sequence(self):
+        """Sequence of logZ, logvol, nlive etc. through the most recent results.
+
+        It is computed when first accessed.
+        """
+        return self._run_sequence['sequence'][0]
+
+    def _write_chain(self, name, columns, data):
+        """Write table `data` with column names `columns` to the chains folder.
+
+        The format is set by `chains_format`, see :py:func:`read_chain`.
+        """
+        chains_dir = self.logs['chains']
+        data = np.asarray(data, dtype=float)
+        assert data.shape[1] == len(columns), (data.shape, columns)
+        if self.chains_format == 'txt':
+            np.savetxt(os.path.join(chains_dir, name + '.txt'), data,
+                       header=' '.join(columns), comments='')
+        elif self.chains_format == 'npz':
+            np.savez(os.path.join(chains_dir, name + '.npz'), data=data, columns=columns)
+        else:
+            import h5py
+            with h5py.File(os.path.join(chains_dir, 'chains.hdf5'), 'a') as fileobj:
+                if name in fileobj:
+                    # overwrite in place, because deleting
+                    # datasets does not free their space
+                    dataset = fileobj[name]
+                    dataset.resize(data.shape)
+                    dataset[:] = data
+                else:
+                    dataset = fileobj.create_dataset(
+                        name, data=data, maxshape=(None, data.shape[1]), chunks=True)
+                dataset.attrs['columns'] = columns
+
+    def _write_results(self):
+        """Write summaries of the most recent results to disk."""
+        results = self.results
+        if self.log:
+            self.logger.info("Writing samples and results to disk ...")
+        self._write_chain(
+            'equal_weighted_post', self.paramnames + self.derivedparamnames,
+            results['samples'])
+
+        results_simple = dict(results)
+        results_simple.pop('weighted_samples')
+        results_simple.pop('samples')
+        with open(os.path.join(self.logs['info'], 'results.json'), 'w') as f:
+            json.dump(results_simple, f, indent=4)
+
+        np.savetxt(
+            os.path.join(self.logs['info'], 'post_summary.csv'),
+            [np.hstack([results['posterior'][k] for k in ('mean', 'stdev', 'median', 'errlo', 'errup')])],
+            header=', '.join(['"{0}_mean", "{0}_stdev", "{0}_median", "{0}_errlo", "{0}_errup"'.format(k)
+                              for k in self.paramnames + self.derivedparamnames]),
+            delimiter=',', comments='',
+        )
+
+        sequence = self.run_sequence
+        keys = ['logz', 'logzerr', 'logvol', 'nlive', 'logl', 'logwt', 'insert_order']
+        self._write_chain(
+            'run', keys,
+            np.hstack(tuple([np.reshape(sequence[k], (-1, 1)) for k in keys])))
+        if self.log:
+            self.logger.info("Writing samples and results to disk ... done")
 
     def store_tree(self):
         """Store tree to disk (results/tree.hdf5)."""
@@ -2736,10 +3127,144 @@ class ReactiveNestedSampler(object):
             self.logger.debug('Making run plot ... done')
 
 
+def read_chain(log_dir, name='weighted_post'):
+    """
+    Read a table from the chains folder of UltraNest.
+
+    The format (txt, npz or hdf5) is detected from the files present,
+    see the `chains_format` option of :py:class:`ReactiveNestedSampler`.
+
+    Parameters
+    ----------
+    log_dir: str
+        Folder containing results
+    name: str
+        Name of the table, one of 'weighted_post', 'weighted_post_untransformed',
+        'equal_weighted_post' and 'run'.
+
+    Returns
+    ----------
+    columns: list
+        column names
+    data: array
+        table, one row per sample (or iteration, for 'run')
+
+    """
+    chains_dir = os.path.join(log_dir, 'chains')
+    filepath = os.path.join(chains_dir, name + '.txt')
+    if os.path.exists(filepath):
+        with open(filepath) as f:
+            columns = f.readline().split()
+        data = np.loadtxt(filepath, skiprows=1, ndmin=2)
+        return columns, data
+
+    filepath = os.path.join(chains_dir, name + '.npz')
+    if os.path.exists(filepath):
+        with np.load(filepath) as f:
+            return f['columns'].tolist(), f['data']
+
+    filepath = os.path.join(chains_dir, 'chains.hdf5')
+    if os.path.exists(filepath):
+        import h5py
+        with h5py.File(filepath, 'r') as fileobj:
+            if name in fileobj:
+                dataset = fileobj[name]
+                columns = [c.decode() if isinstance(c, bytes) else str(c) for c in dataset.attrs['columns']]
+                return columns, dataset[:]
+
+    raise IOError("Table '%s' not found in '%s'" % (name, chains_dir))
+
+
+def _tree_from_points(points, x_dim, pointpile):
+    """Build the tree of stored `points` with array operations.
+
+    Gives the same tree as replaying the exploration, where each
+    node receives as children all points sampled from at most its
+    likelihood, and with higher likelihood. A point is thus the
+    child of the lowest node at or above its likelihood threshold.
+
+    Parameters
+    ----------
+    points: array
+        rows of [Lmin, L, quality, u, p], as stored in the point store
+    x_dim: int
+        number of dimensions
+    pointpile: PointPile
+        the points in the tree are stored here.
+
+    Returns
+    ----------
+    root: TreeNode
+        pseudo-root of the tree, None if the points have
+        tied likelihoods, which requires replaying the exploration.
+
+    """
+    Lmins = points[:,0]
+    Ls = points[:,1]
+    with np.errstate(invalid='ignore'):
+        isroot = np.logical_and(Lmins == -np.inf, Ls > -np.inf)
+        candidates = np.where(np.logical_and(~isroot, Lmins < Ls))[0]
+    roots = np.where(isroot)[0]
+    intree = np.concatenate((roots, candidates))
+    if len(np.unique(Ls[intree])) != len(intree):
+        return None
+
+    # assume all points are in the tree, and remove those
+    # without a parent, until the tree is consistent.
+    while True:
+        nodes_sorted = intree[np.argsort(Ls[intree])]
+        Ls_sorted = Ls[nodes_sorted]
+        # lowest node at or above the threshold
+        pos = np.searchsorted(Ls_sorted, Lmins[candidates], side='left')
+        pos_valid = pos < len(nodes_sorted)
+        haveparent = np.zeros(len(candidates), dtype=bool)
+        haveparent[pos_valid] = Ls_sorted[pos[pos_valid]] < Ls[candidates[pos_valid]]
+        if haveparent.sum() + len(roots) == len(intree):
+            break
+        intree = np.concatenate((roots, candidates[haveparent]))
+    children = candidates[haveparent]
+    parent_of = np.empty(len(points), dtype=int)
+    parent_of[children] = nodes_sorted[pos[haveparent]]
+
+    # parents have lower likelihoods, so they come first in this order
+    depth = np.zeros(len(points), dtype=int)
+    depth_list = depth.tolist()
+    parent_list = parent_of.tolist()
+    for i in nodes_sorted[~isroot[nodes_sorted]].tolist():
+        depth_list[i] = depth_list[parent_list[i]] + 1
+    depth[:] = depth_list
+
+    # number the nodes level by level: the children of a node
+    # follow in the order of their parents, then in storage order
+    new_index = np.empty(len(points), dtype=int)
+    new_index[roots] = np.arange(len(roots))
+    ordered = [roots]
+    nordered = len(roots)
+    children = children[np.argsort(depth[children], kind='stable')]
+    level_starts = np.searchsorted(depth[children], np.arange(1, depth.max(initial=0) + 2))
+    for lo, hi in zip(level_starts[:-1], level_starts[1:]):
+        level = children[lo:hi]
+        level = level[np.lexsort((level, new_index[parent_of[level]]))]
+        new_index[level] = np.arange(nordered, nordered + len(level))
+        ordered.append(level)
+        nordered += len(level)
+    ordered = np.concatenate(ordered)
+
+    parents = -np.ones(len(ordered), dtype=int)
+    parents[len(roots):] = new_index[parent_of[ordered[len(roots):]]]
+    nchildren = np.bincount(parents[len(roots):], minlength=len(ordered))
+    ids = pointpile.add_many(points[ordered,3:3 + x_dim], points[ordered,3 + x_dim:])
+    tree = ArrayTree(Ls[ordered], ids, parents, nchildren)
+    return TreeNode(id=-1, value=-np.inf, children=tree.to_roots())
+
+
 def read_file(log_dir, x_dim, num_bootstraps=20, random=True, verbose=False, check_insertion_order=True):
     """
     Read the output HDF5 file of UltraNest.
 
+    The tree of the run is reconstructed from the stored points
+    with array operations, and then integrated.
+
     Parameters
     ----------
     log_dir: str
@@ -2781,39 +3306,34 @@ def read_file(log_dir, x_dim, num_bootstraps=20, random=True, verbose=False, che
     points = fileobj['points'][:]
     fileobj.close()
     del fileobj
-    stack = list(enumerate(points))
 
     pointpile = PointPile(x_dim, num_params)
+    root = _tree_from_points(points, x_dim, pointpile)
+    if root is not None:
+        return logz_sequence(root, pointpile, nbootstraps=num_bootstraps,
+                             random=random, verbose=verbose,
+                             check_insertion_order=check_insertion_order)
+
+    # with tied likelihood values, replay the exploration
+    stack = PointStack(points)
+    pointpile.reserve(len(points))
 
-    def pop(Lmin):
-        """ find matching sample from points file """
-        # look forward to see if there is an exact match
-        # if we do not use the exact matches
-        #   this causes a shift in the loglikelihoods
-        for i, (idx, next_row) in enumerate(stack):
-            row_Lmin = next_row[0]
-            L = next_row[1]
-            if row_Lmin <= Lmin and L > Lmin:
-                idx, row = stack.pop(i)
-                return idx, row
-        return None, None
-
-    roots = []
+    rows = []
     while True:
-        _, row = pop(-np.inf)
+        _, row = stack.pop(-np.inf)
         if row is None:
             break
-        logl = row[1]
-        u = row[3:3 + x_dim]
-        v = row[3 + x_dim:3 + x_dim + num_params]
-        roots.append(pointpile.make_node(logl, u, v))
+        rows.append(row)
+    rows = np.reshape(rows, (-1, ncols))
+    roots = pointpile.make_nodes(
+        rows[:,1], rows[:,3:3 + x_dim], rows[:,3 + x_dim:3 + x_dim + num_params])
 
     root = TreeNode(id=-1, value=-np.inf, children=roots)
 
     def onNode(node, main_iterator):
         """ insert (single) child of node if available """
         while True:
-            _, row = pop(node.value)
+            _, row = stack.pop(node.value)
             if row is None:
                  break
             if row is not None:
@@ -9,6 +9,11 @@ cimport numpy as np
 from numpy import pi
 cimport cython
 
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
 cdef count_nearby(np.ndarray[np.float_t, ndim=2] apts,
@@ -85,14 +90,27 @@ cdef float compute_maxradiussq(np.ndarray[np.float_t, ndim=2] apts, np.ndarray[n
     """Measure shortest euclidean distance to any point in `apts`, for each point `b` in `bpts`.
 
     Returns the square of the maximum over these.
+
+    The computation releases the GIL, so that several
+    calls can run in parallel threads.
     """
+    cdef double[:, :] a = apts
+    cdef double[:, :] b = bpts
+    cdef np.float_t maxd
+    with nogil:
+        maxd = _compute_maxradiussq_nogil(a, b)
+    return maxd
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef np.float_t _compute_maxradiussq_nogil(double[:, :] apts, double[:, :] bpts) nogil:
+    """Kernel of `compute_maxradiussq`."""
     cdef size_t na = apts.shape[0]
     cdef size_t nb = bpts.shape[0]
     cdef size_t ndim = apts.shape[1]
-    #assert ndim == bpts.shape[1]
-    #assert f.dtype == np.float_t and g.dtype == np.float_t
 
-    cdef unsigned long i, j
+    cdef size_t i, j, k
     cdef np.float_t d
     cdef np.float_t mind = 1e300
     cdef np.float_t maxd = 0
@@ -113,6 +131,167 @@ cdef float compute_maxradiussq(np.ndarray[np.float_t, ndim=2] apts, np.ndarray[n
     return maxd
 
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef _find_nearby_candidates(
+    np.ndarray[np.float_t, ndim=2] apts,
+    np.ndarray[np.float_t, ndim=2] bpts,
+    np.float_t radiussq,
+    candidates,
+    np.ndarray[np.uint8_t, ndim=1] stale,
+    np.ndarray[np.int_t, ndim=1] stale_ids,
+    np.ndarray[np.int_t, ndim=1] nnearby,
+    bint count
+):
+    """Like `find_nearby` (or `count_nearby` if `count`), but only visits `candidates`.
+
+    `candidates[j]` is a list of indices of `apts` which may be near `bpts[j]`.
+    Candidates marked `stale` are skipped, the points `stale_ids`
+    are instead compared against every point `b`.
+    Distances are computed exactly like the brute-force functions.
+    """
+    cdef size_t nb = bpts.shape[0]
+    cdef size_t ndim = apts.shape[1]
+    cdef size_t nstale = stale_ids.shape[0]
+
+    cdef long i
+    cdef size_t j, k, l
+    cdef np.float_t d
+
+    for j in range(nb):
+        nnearby[j] = 0 if count else -1
+        for i in candidates[j]:
+            if stale[i] or (not count and nnearby[j] >= 0 and i > nnearby[j]):
+                continue
+            d = 0.0
+            for k in range(ndim):
+                d += (apts[i,k] - bpts[j,k])**2
+            if d <= radiussq:
+                if count:
+                    nnearby[j] += 1
+                else:
+                    nnearby[j] = i
+        for l in range(nstale):
+            i = stale_ids[l]
+            if not count and nnearby[j] >= 0 and i > nnearby[j]:
+                continue
+            d = 0.0
+            for k in range(ndim):
+                d += (apts[i,k] - bpts[j,k])**2
+            if d <= radiussq:
+                if count:
+                    nnearby[j] += 1
+                else:
+                    nnearby[j] = i
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef float _compute_maxradiussq_nearest(
+    np.ndarray[np.float_t, ndim=2] apts,
+    np.ndarray[np.float_t, ndim=2] bpts,
+    np.ndarray[np.int_t, ndim=1] nearest
+):
+    """Like `compute_maxradiussq`, but with the index of the nearest point in `apts` already known.
+
+    `nearest[j]` is the index of the point in `apts` closest to `bpts[j]`.
+    """
+    cdef size_t nb = bpts.shape[0]
+    cdef size_t ndim = apts.shape[1]
+
+    cdef size_t j, k
+    cdef long i
+    cdef np.float_t d
+    cdef np.float_t maxd = 0
+
+    for j in range(nb):
+        i = nearest[j]
+        d = 0
+        for k in range(ndim):
+            d += (apts[i,k] - bpts[j,k])**2
+        maxd = max(maxd, d)
+
+    return maxd
+
+
+class NeighbourIndex(object):
+    """Spatial index (k-d tree) of points, for fast neighbour queries.
+
+    Answers the same questions as `find_nearby` and `count_nearby`,
+    with identical results, but only computes distances to points
+    near each query point. The tree is used to
+    select candidates, the decision is made with the same exact
+    arithmetic as the brute-force functions.
+
+    The indexed points are referenced, not copied. When a point
+    is changed in place, call `replace` to keep the index consistent.
+    Changed points are compared by brute force until enough of them
+    accumulate to warrant rebuilding the tree.
+    """
+
+    def __init__(self, points, leafsize=16):
+        """Build index.
+
+        Parameters
+        -----------
+        points: array of vectors
+            points to index
+        leafsize: int
+            number of points at which the tree switches to brute force
+        """
+        self.points = points
+        self.leafsize = leafsize
+        self.max_stale = max(16, int(len(points)**0.5))
+        self.rebuild()
+
+    def rebuild(self):
+        """Rebuild tree from current points."""
+        self.tree = cKDTree(self.points, leafsize=self.leafsize)
+        self.stale = np.zeros(len(self.points), dtype=np.uint8)
+        self.stale_ids = []
+
+    def replace(self, i):
+        """Register that point `i` has been changed in place."""
+        if not self.stale[i]:
+            self.stale[i] = 1
+            self.stale_ids.append(i)
+            if len(self.stale_ids) > self.max_stale:
+                self.rebuild()
+
+    def _query(self, bpts, radiussq, nnearby, count):
+        # widen the search slightly, so that no point is missed due
+        # to round-off differences between tree and exact distances
+        candidates = self.tree.query_ball_point(bpts, (radiussq * (1 + 1e-9))**0.5)
+        _find_nearby_candidates(
+            self.points, bpts, radiussq, candidates, self.stale,
+            np.asarray(self.stale_ids, dtype=int), nnearby, count)
+
+    def find_nearby(self, bpts, radiussq, nnearby):
+        """Gets the index of a point within square radius `radiussq`, for each point `b` in `bpts`.
+
+        Same as the function `find_nearby` applied to the indexed points,
+        including returning the lowest such index.
+        """
+        if len(bpts) > 0:
+            self._query(bpts, radiussq, nnearby, False)
+
+    def count_nearby(self, bpts, radiussq, nnearby):
+        """Count the number of points within square radius `radiussq` for each point `b` in `bpts`.
+
+        Same as the function `count_nearby` applied to the indexed points.
+        """
+        if len(bpts) > 0:
+            self._query(bpts, radiussq, nnearby, True)
+
+
+def _compute_maxradiussq(apts, bpts, use_index=False):
+    """Compute `compute_maxradiussq`, optionally with a k-d tree over `apts`."""
+    if use_index and len(apts) > 0 and len(bpts) > 0:
+        _, nearest = cKDTree(apts).query(bpts, k=1)
+        return _compute_maxradiussq_nearest(apts, bpts, nearest.astype(int))
+    return compute_maxradiussq(apts, bpts)
+
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
 def compute_mean_pair_distance(
@@ -623,8 +802,14 @@ class MLFriends(object):
     2. proposing new points.
 
     Learns geometry of region from existing live points.
+
+    With many live points, neighbour queries use a k-d tree
+    (see `NeighbourIndex`), if scipy is available.
     """
 
+    # use brute force for fewer live points than this
+    neighbour_index_min_points = 1000
+
     def __init__(self, u, transformLayer):
         """Initialise region.
 
@@ -673,12 +858,83 @@ class MLFriends(object):
         self.bbox_lo = self.unormed.min(axis=0)
         self.bbox_hi = self.unormed.max(axis=0)
         self.maxradiussq = None
+        self.neighbour_index = None
+        self.u_sum = self.u.sum(axis=0)
+        self.nreplaced = 0
+
+    def replace_point(self, index, u):
+        """Replace live point number `index` with `u`.
+
+        Updates the transformed coordinates, the neighbour index
+        and moves the wrapping ellipsoid to the new mean of the live points.
+        Radius, enlargement and ellipsoid shape are not changed.
+        The cost is O(ndim), independent of the number of live points.
+        """
+        self.u_sum += u - self.u[index]
+        self.u[index] = u
+        self.unormed[index] = self.transformLayer.transform(u)
+        if self.neighbour_index is not None:
+            self.neighbour_index.replace(index)
+
+        self.nreplaced += 1
+        if self.nreplaced >= len(self.u):
+            # avoid accumulating round-off errors in the running sum
+            self.u_sum = self.u.sum(axis=0)
+            self.nreplaced = 0
+        self.ellipsoid_center = self.u_sum / len(self.u)
+
+    def use_neighbour_index(self, npoints=None):
+        """Whether neighbour queries over `npoints` points should use a k-d tree.
+
+        A tree only pays off if there are many more points than 2^ndim.
+        """
+        N, ndim = self.u.shape
+        if npoints is None:
+            npoints = N
+        return cKDTree is not None and npoints >= max(self.neighbour_index_min_points, 2**ndim)
+
+    def get_neighbour_index(self):
+        """Return the spatial index of the live points, or None if brute force is used.
+
+        The index is built on first use and kept until the
+        transformLayer or the points are reset.
+        """
+        if self.neighbour_index is None and self.use_neighbour_index():
+            self.neighbour_index = NeighbourIndex(self.unormed)
+        return self.neighbour_index
+
+    def find_nearby(self, bpts):
+        """Gets the index of a live point within the MLFriends radius, for each point `b` in `bpts`.
+
+        `bpts` are in transformed coordinates. -1 indicates no neighbour.
+        """
+        idnearby = np.empty(len(bpts), dtype=int)
+        index = self.get_neighbour_index()
+        if index is None:
+            find_nearby(self.unormed, bpts, self.maxradiussq, idnearby)
+        else:
+            index.find_nearby(bpts, self.maxradiussq, idnearby)
+        return idnearby
+
+    def count_nearby(self, bpts):
+        """Count the number of live points within the MLFriends radius, for each point `b` in `bpts`.
+
+        `bpts` are in transformed coordinates.
+        """
+        nnearby = np.empty(len(bpts), dtype=int)
+        index = self.get_neighbour_index()
+        if index is None:
+            count_nearby(self.unormed, bpts, self.maxradiussq, nnearby)
+        else:
+            index.count_nearby(bpts, self.maxradiussq, nnearby)
+        return nnearby
 
     def compute_maxradiussq(self, nbootstraps=50):
         """Return MLFriends radius after `nbootstraps` bootstrapping rounds"""
         N, ndim = self.u.shape
         selected = np.empty(N, dtype=bool)
         maxd = 0
+        use_index = self.use_neighbour_index()
 
         for i in range(nbootstraps):
             idx = np.random.randint(N, size=N)
@@ -688,49 +944,96 @@ class MLFriends(object):
             b = self.unormed[~selected,:]
 
             # compute distances from a to b
-            maxd = max(maxd, compute_maxradiussq(a, b))
+            maxd = max(maxd, _compute_maxradiussq(a, b, use_index))
 
         assert maxd > 0, (maxd, self.u)
         return maxd
 
-    def compute_enlargement(self, nbootstraps=50, minvol=0., rng=np.random):
+    def compute_enlargement(self, nbootstraps=50, minvol=0., rng=np.random, num_threads=1, selections=None, rows=None):
         """Return MLFriends radius and ellipsoid enlargement after `nbootstraps` bootstrapping rounds.
 
         The wrapping ellipsoid covariance is determined in each bootstrap round.
-        """
-        N, ndim = self.u.shape
-        assert np.isfinite(self.unormed).all(), self.unormed
-        selected = np.empty(N, dtype=bool)
-        maxd = 0.0
-        maxf = 0.0
 
-        for i in range(nbootstraps):
-            idx = rng.randint(N, size=N)
-            selected[:] = False
-            selected[idx] = True
-            ta = self.unormed[selected,:]
-            tb = self.unormed[~selected,:]
-            ua = self.u[selected,:]
-            ub = self.u[~selected,:]
+        With `num_threads` > 1, the bootstrap rounds are computed in parallel
+        by a pool of threads. The result is the same as for a single thread.
 
-            # compute distances from a to b
-            maxd = max(maxd, compute_maxradiussq(ta, tb))
+        `selections` is an optional list of index arrays, one per bootstrap
+        round, to use instead of drawing them from `rng`.
 
-            # compute enlargement of bounding ellipsoid
-            ctr, cov = bounding_ellipsoid(ua, minvol=(minvol / self.vol_prefactor)**2)
-            a = np.linalg.inv(cov)  # inverse covariance
-            # compute expansion factor
-            delta = ub - ctr
-            #f = np.einsum('...i, ...i', np.tensordot(delta, a, axes=1), delta).max()
-            f = np.einsum('ij,jk,ik->i', delta, a, delta).max()
-            assert np.isfinite(f), (ctr, cov, self.unormed, f, delta, a)
-            assert f > 0, (f, len(ua), len(ub), delta, ctr, np.einsum('...i, ...i', np.tensordot(delta, a, axes=1), delta))
-            maxf = max(maxf, f)
+        If `rows` is a tuple (i, n), the points left out in each round
+        are split into `n` blocks, and only the distances and enlargements
+        of block `i` are computed. The maximum over all `n` blocks
+        then gives the same result as a call without `rows`.
+        A block may be empty, in which case zero is returned.
+        """
+        N, ndim = self.u.shape
+        assert np.isfinite(self.unormed).all(), self.unormed
+        use_index = self.use_neighbour_index()
+        if selections is None:
+            # draw all bootstrap selections upfront, in the same order as one thread would
+            selections = [rng.randint(N, size=N) for i in range(nbootstraps)]
+        if rows is not None:
+            block, nblocks = rows
+            assert 0 <= block < nblocks, rows
+
+        if num_threads > 1 and nbootstraps > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            # floating point error handling is per-thread, so pass on the current settings
+            errsettings = np.geterr()
+
+            def compute(idx):
+                with np.errstate(**errsettings):
+                    return self._compute_enlargement_bootstrap(idx, minvol, use_index, rows=rows)
+
+            with ThreadPoolExecutor(max_workers=num_threads) as pool:
+                results = list(pool.map(compute, selections))
+        else:
+            results = [self._compute_enlargement_bootstrap(idx, minvol, use_index, rows=rows) for idx in selections]
 
+        maxd = max([0.0] + [d for d, f in results])
+        maxf = max([0.0] + [f for d, f in results])
+        if rows is not None:
+            # a single block may legitimately be empty
+            return maxd, maxf
         assert maxd > 0, (maxd, self.u, self.unormed)
         assert maxf > 0, (maxf, self.u, self.unormed)
         return maxd, maxf
 
+    def _compute_enlargement_bootstrap(self, idx, minvol, use_index, rows=None):
+        """Compute MLFriends radius and ellipsoid enlargement for one bootstrap round.
+
+        The points at indices `idx` are used to predict the others.
+        If `rows` is a tuple (i, n), only block `i` of `n` of the
+        other points is predicted.
+        """
+        N, ndim = self.u.shape
+        selected = np.zeros(N, dtype=bool)
+        selected[idx] = True
+        ta = self.unormed[selected,:]
+        tb = self.unormed[~selected,:]
+        ua = self.u[selected,:]
+        ub = self.u[~selected,:]
+        if rows is not None:
+            block, nblocks = rows
+            tb = np.array_split(tb, nblocks)[block]
+            ub = np.array_split(ub, nblocks)[block]
+            if len(tb) == 0:
+                return 0.0, 0.0
+
+        # compute distances from a to b
+        d = _compute_maxradiussq(ta, tb, use_index)
+
+        # compute enlargement of bounding ellipsoid
+        ctr, cov = bounding_ellipsoid(ua, minvol=(minvol / self.vol_prefactor)**2)
+        a = np.linalg.inv(cov)  # inverse covariance
+        # compute expansion factor
+        delta = ub - ctr
+        #f = np.einsum('...i, ...i', np.tensordot(delta, a, axes=1), delta).max()
+        f = np.einsum('ij,jk,ik->i', delta, a, delta).max()
+        assert np.isfinite(f), (ctr, cov, self.unormed, f, delta, a)
+        assert f > 0, (f, len(ua), len(ub), delta, ctr, np.einsum('...i, ...i', np.tensordot(delta, a, axes=1), delta))
+        return d, f
+
     def sample_from_points(self, nsamples=100):
         """Draw uniformly sampled points from MLFriends region.
 
@@ -744,8 +1047,7 @@ class MLFriends(object):
         v = self.unormed[idx,:] + v * self.maxradiussq**0.5
 
         # count how many are around
-        nnearby = np.empty(nsamples, dtype=int)
-        count_nearby(self.unormed, v, self.maxradiussq, nnearby)
+        nnearby = self.count_nearby(v)
         vmask = np.random.uniform(high=nnearby) < 1
         w = self.transformLayer.untransform(v[vmask,:])
         wmask = np.logical_and(w > 0, w < 1).all(axis=1)
@@ -764,8 +1066,7 @@ class MLFriends(object):
         wmask = self.inside_ellipsoid(u)
         # check if inside region in transformed space
         v = self.transformLayer.transform(u[wmask,:])
-        idnearby = np.empty(len(v), dtype=int)
-        find_nearby(self.unormed, v, self.maxradiussq, idnearby)
+        idnearby = self.find_nearby(v)
         vmask = idnearby >= 0
         return u[wmask,:][vmask,:], idnearby[vmask]
 
@@ -777,8 +1078,7 @@ class MLFriends(object):
         N, ndim = self.u.shape
         # draw from rectangle in transformed space
         v = np.random.uniform(self.bbox_lo - self.maxradiussq, self.bbox_hi + self.maxradiussq, size=(nsamples, ndim))
-        idnearby = np.empty(nsamples, dtype=int)
-        find_nearby(self.unormed, v, self.maxradiussq, idnearby)
+        idnearby = self.find_nearby(v)
         vmask = idnearby >= 0
 
         # check if inside unit cube
@@ -807,8 +1107,7 @@ class MLFriends(object):
 
         wmask = np.logical_and(w > 0, w < 1).all(axis=1)
         v = self.transformLayer.transform(w[wmask,:])
-        idnearby = np.empty(len(v), dtype=int)
-        find_nearby(self.unormed, v, self.maxradiussq, idnearby)
+        idnearby = self.find_nearby(v)
         vmask = idnearby >= 0
 
         return w[wmask,:][vmask,:], idnearby[vmask]
@@ -846,8 +1145,7 @@ class MLFriends(object):
         if mask.any():
             # additionally require points to be near neighbours
             bpts = self.transformLayer.transform(pts[mask,:])
-            idnearby = np.empty(len(bpts), dtype=int)
-            find_nearby(self.unormed, bpts, self.maxradiussq, idnearby)
+            idnearby = self.find_nearby(bpts)
             mask[mask] = idnearby >= 0
 
         return mask
@@ -25,7 +25,8 @@ from numpy import log, log1p, exp, logaddexp
 import math
 import operator
 import sys
-from .utils import resample_equal
+import heapq
+from .utils import resample_equal, LazyDict
 from .ordertest import UniformOrderAccumulator
 
 
@@ -67,6 +68,11 @@ class BreadthFirstIterator(object):
 
     Nodes are ordered by value and expanded in order.
     The number of edges passing the node "in parallel" are "active".
+
+    The active nodes are kept in a priority queue, so finding the next node
+    is O(log N). Nodes with the same value are expanded in the order they
+    became active. The active node properties are kept in arrays,
+    which are updated in place.
     """
 
     def __init__(self, roots):
@@ -76,14 +82,42 @@ class BreadthFirstIterator(object):
 
     def reset(self):
         """(Re)start exploration from the top."""
+        nroots = len(self.roots)
+        capacity = max(16, 2 * nroots)
         self.active_nodes = list(self.roots)
-        self.active_root_ids = np.arange(len(self.active_nodes))
-        self.active_node_values = np.array([n.value for n in self.active_nodes])
-        self.active_node_ids = np.array([n.id for n in self.active_nodes])
-        assert len(self.active_nodes) == len(self.active_root_ids)
-        assert len(self.active_nodes) == len(self.active_node_values)
+        self.nactive = nroots
+        self._values = np.empty(capacity)
+        self._root_ids = np.empty(capacity, dtype=int)
+        self._node_ids = np.empty(capacity, dtype=int)
+        self._values[:nroots] = [n.value for n in self.roots]
+        self._root_ids[:nroots] = np.arange(nroots)
+        self._node_ids[:nroots] = [n.id for n in self.roots]
+        # each active node gets a key, increasing in the order of activation
+        # the priority queue contains (value, key) entries
+        # slots are the positions of the active nodes in the arrays
+        self._slot_keys = np.empty(capacity, dtype=int)
+        self._slot_keys[:nroots] = np.arange(nroots)
+        self._key_slots = dict(zip(range(nroots), range(nroots)))
+        self._next_key = nroots
+        self._queue = list(zip(self._values[:nroots].tolist(), range(nroots)))
+        heapq.heapify(self._queue)
         # print("starting live points from %d roots" % len(self.roots), len(self.active_nodes))
 
+    @property
+    def active_node_values(self):
+        """Values of the active nodes."""
+        return self._values[:self.nactive]
+
+    @property
+    def active_root_ids(self):
+        """Root ids of the active nodes."""
+        return self._root_ids[:self.nactive]
+
+    @property
+    def active_node_ids(self):
+        """Ids of the active nodes."""
+        return self._node_ids[:self.nactive]
+
     def next_node(self):
         """Get next node in order.
 
@@ -96,29 +130,65 @@ class BreadthFirstIterator(object):
         otherwise
 
         """
-        if self.active_nodes == []:
+        if self.nactive == 0:
             return None
-        self.next_index = np.argmin(self.active_node_values)
-        i = self.next_index
+        _, key = self._queue[0]
+        self.next_index = i = self._key_slots[key]
         node = self.active_nodes[i]
-        rootid = self.active_root_ids[i]
-        assert not isinstance(rootid, float)
+        rootid = self._root_ids[i]
         # print("consuming %.1f" % node.value, len(node.children), 'nlive:', len(self.active_nodes))
-        assert len(self.active_nodes) == len(self.active_root_ids)
-        assert len(self.active_nodes) == len(self.active_node_values)
         return rootid, node, (self.active_nodes, self.active_root_ids, self.active_node_values, self.active_node_ids)
 
+    def _pop_next(self):
+        """Remove the next node from the priority queue, return its slot."""
+        _, key = heapq.heappop(self._queue)
+        i = self._key_slots.pop(key)
+        assert i == self.next_index, (i, self.next_index)
+        return i
+
+    def _set_slot(self, i, node, rootid):
+        """Put *node* into slot *i* and into the priority queue."""
+        key = self._next_key
+        self._next_key += 1
+        self.active_nodes[i] = node
+        self._values[i] = node.value
+        self._root_ids[i] = rootid
+        self._node_ids[i] = node.id
+        self._slot_keys[i] = key
+        self._key_slots[key] = i
+        heapq.heappush(self._queue, (node.value, key))
+
+    def _remove_slot(self, i):
+        """Remove slot *i*, by moving the last slot into it."""
+        last = self.nactive - 1
+        if i != last:
+            self.active_nodes[i] = self.active_nodes[last]
+            self._values[i] = self._values[last]
+            self._root_ids[i] = self._root_ids[last]
+            self._node_ids[i] = self._node_ids[last]
+            key = self._slot_keys[last]
+            self._slot_keys[i] = key
+            self._key_slots[key] = i
+        self.active_nodes.pop()
+        self.nactive -= 1
+
+    def _reserve(self, nactive):
+        """Make space for *nactive* active nodes."""
+        capacity = len(self._values)
+        if nactive <= capacity:
+            return
+        # grow geometrically, so that the copying costs are amortized
+        capacity = max(nactive, 2 * capacity)
+        for name in '_values', '_root_ids', '_node_ids', '_slot_keys':
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.nactive] = old[:self.nactive]
+            setattr(self, name, new)
+
     def drop_next_node(self):
         """Forget the current node."""
-        i = self.next_index
-        mask = np.ones(len(self.active_nodes), dtype=bool)
-        mask[i] = False
-        self.active_nodes.pop(i)
-        self.active_node_values = self.active_node_values[mask]
-        self.active_root_ids = self.active_root_ids[mask]
-        self.active_node_ids = self.active_node_ids[mask]
-        assert len(self.active_nodes) == len(self.active_root_ids)
-        assert len(self.active_nodes) == len(self.active_node_values)
+        self._remove_slot(self._pop_next())
+        assert len(self.active_nodes) == self.nactive
 
     def expand_children_of(self, rootid, node):
         """Replace the current node with its children.
@@ -126,35 +196,357 @@ class BreadthFirstIterator(object):
         rootid and node have to come from the most recent call to next_node.
         """
         # print("replacing %.1f" % node.value, len(node.children))
-        i = self.next_index
-        newnnodes = len(self.active_nodes) - 1 + len(node.children)
+        i = self._pop_next()
+        newnnodes = self.nactive - 1 + len(node.children)
         if len(node.children) == 1:
-            self.active_nodes[i] = node.children[0]
-            self.active_node_values[i] = node.children[0].value
-            self.active_root_ids[i] = rootid
-            self.active_node_ids[i] = node.children[0].id
+            self._set_slot(i, node.children[0], rootid)
         else:
-            mask = np.ones(len(self.active_nodes), dtype=bool)
-            mask[i] = False
-            self.active_nodes.pop(i)
-            if len(node.children) == 0:
-                self.active_node_values = self.active_node_values[mask]
-                self.active_root_ids = self.active_root_ids[mask]
-                self.active_node_ids = self.active_node_ids[mask]
-            else:
-                self.active_nodes += node.children
-                self.active_node_values = np.concatenate((self.active_node_values[mask], [c.value for c in node.children]))
-                # print(self.active_root_ids, '+', [rootid for c in node.children], '-->')
-                self.active_root_ids = np.concatenate((self.active_root_ids[mask], [rootid for c in node.children]))
-                self.active_node_ids = np.concatenate((self.active_node_ids[mask], [c.id for c in node.children]))
-                # print(self.active_root_ids)
-            assert len(self.active_nodes) == len(self.active_root_ids)
-            assert len(self.active_nodes) == len(self.active_node_values)
-            assert len(self.active_nodes) == len(self.active_node_ids)
+            self._remove_slot(i)
+            self._reserve(newnnodes)
+            for child in node.children:
+                self.active_nodes.append(None)
+                self.nactive += 1
+                self._set_slot(self.nactive - 1, child, rootid)
         assert newnnodes == len(self.active_nodes), (len(self.active_nodes), newnnodes, len(node.children))
-        assert newnnodes == len(self.active_root_ids), (len(self.active_root_ids), newnnodes, len(node.children))
-        assert newnnodes == len(self.active_node_values), (len(self.active_node_values), newnnodes, len(node.children))
-        assert newnnodes == len(self.active_node_ids), (len(self.active_node_ids), newnnodes, len(node.children))
+        assert newnnodes == self.nactive, (self.nactive, newnnodes, len(node.children))
+
+
+class ArrayTree(object):
+    """Compact tree, stored as arrays.
+
+    Nodes are numbered level by level: first the roots, then their children,
+    then the grand-children, etc. The children of a node are contiguous.
+
+    **Attributes** (one entry per node):
+
+    - ``values``: value (loglikelihood) of the node
+    - ``ids``: refers to the order of discovery and storage (PointPile)
+    - ``parents``: index of parent node, -1 for roots
+    - ``child_offsets``: index of the first child
+    - ``nchildren``: number of children
+
+    If every child has a value above its parent (``ordered``),
+    the breadth-first exploration visits the nodes sorted by value,
+    and tree statistics can be computed with vectorized operations
+    instead of walking the tree. The exploration itself can also
+    use the precomputed order, see :py:class:`ArrayBreadthFirstIterator`.
+    """
+
+    def __init__(self, values, ids, parents, nchildren, nodes=None):
+        """Define ArrayTree.
+
+        Parameters
+        ----------
+        values: array of floats
+            node values
+        ids: array of ints
+            node ids
+        parents: array of ints
+            index of parent node, -1 for roots.
+            Nodes have to be sorted by level, with the children of
+            each node contiguous, and in the order of their parents.
+        nchildren: array of ints
+            number of children of each node
+        nodes: list of TreeNodes or None
+            original tree nodes, for mapping back.
+
+        """
+        self.values = np.asarray(values, dtype=float)
+        self.ids = np.asarray(ids, dtype=int)
+        self.parents = np.asarray(parents, dtype=int)
+        self.nchildren = np.asarray(nchildren, dtype=int)
+        self.nodes = nodes
+        self.nroots = int((self.parents == -1).sum())
+        assert (self.parents[:self.nroots] == -1).all(), 'roots have to come first'
+        self.child_offsets = self.nroots + np.cumsum(self.nchildren) - self.nchildren
+        # levels: 0 for roots, 1 for their children, ...
+        # the children of one level are the next level
+        self.level_starts = [0, self.nroots]
+        while self.level_starts[-1] < len(self.values):
+            lo, hi = self.level_starts[-2:]
+            assert hi > lo, 'nodes are not connected to the roots'
+            self.level_starts.append(hi + self.nchildren[lo:hi].sum())
+        assert self.level_starts[-1] == len(self.values), (self.level_starts, len(self.values))
+        haschildren = self.nchildren > 0
+        self.ordered = bool((self.values[self.nroots:] > self.values[self.parents[self.nroots:]]).all())
+        # maximum value of the children of each node
+        self.child_max = np.zeros(len(self.values)) - np.inf
+        if haschildren.any():
+            self.child_max[haschildren] = np.maximum.reduceat(
+                self.values[self.nroots:], self.child_offsets[haschildren] - self.nroots)
+        self._order = None
+
+    @classmethod
+    def from_roots(cls, roots):
+        """Convert tree with TreeNode *roots* into an ArrayTree."""
+        nodes = list(roots)
+        parents = [-1] * len(nodes)
+        i = 0
+        while i < len(nodes):
+            children = nodes[i].children
+            nodes += children
+            parents += [i] * len(children)
+            i += 1
+        values = [n.value for n in nodes]
+        ids = [n.id for n in nodes]
+        nchildren = [len(n.children) for n in nodes]
+        return cls(values, ids, parents, nchildren, nodes=nodes)
+
+    def to_roots(self, keep=None):
+        """Convert into a tree of new TreeNodes, and return its roots.
+
+        Modifying the returned tree does not affect this ArrayTree,
+        nor the TreeNodes it was created from.
+
+        If the boolean array `keep` is given, only these nodes are
+        converted. The parents of kept nodes have to be kept as well.
+        """
+        if keep is None:
+            nodes = [TreeNode(id=i, value=v) for i, v in zip(self.ids.tolist(), self.values)]
+            for node, parent in zip(nodes[self.nroots:], self.parents[self.nroots:].tolist()):
+                nodes[parent].children.append(node)
+            return nodes[:self.nroots]
+
+        indices = np.where(keep)[0]
+        assert keep[self.parents[indices[indices >= self.nroots]]].all(), 'parents of kept nodes need to be kept'
+        nodes = [None] * len(self.values)
+        for i, nodeid in zip(indices.tolist(), self.ids[indices].tolist()):
+            nodes[i] = TreeNode(id=nodeid, value=self.values[i])
+        for i, parent in zip(indices[indices >= self.nroots].tolist(), self.parents[indices[indices >= self.nroots]].tolist()):
+            nodes[parent].children.append(nodes[i])
+        return [nodes[i] for i in indices[indices < self.nroots].tolist()]
+
+    def __len__(self):
+        """Get number of nodes."""
+        return len(self.values)
+
+    def _propagate(self, rootvalues, func):
+        """Compute a quantity level by level.
+
+        The roots have `rootvalues`, the other nodes
+        `func(parent_value, parent_index)`.
+        """
+        out = np.empty(len(self.values), dtype=np.asarray(rootvalues).dtype)
+        out[:self.nroots] = rootvalues
+        for lo, hi in zip(self.level_starts[1:-1], self.level_starts[2:]):
+            parents = self.parents[lo:hi]
+            out[lo:hi] = func(out[parents], parents)
+        return out
+
+    def root_ids(self):
+        """Get the index of the root each node descends from."""
+        return self._propagate(np.arange(self.nroots), lambda parent_rootids, parents: parent_rootids)
+
+    def _children_in_order(self, order):
+        """Get the indices of the children of the nodes *order*, in that order."""
+        order = order[self.nchildren[order] > 0]
+        nchildren = self.nchildren[order]
+        return np.repeat(self.child_offsets[order] - np.cumsum(nchildren) + nchildren, nchildren) + np.arange(nchildren.sum())
+
+    def processing_order(self):
+        """Get node indices in the order of breadth-first exploration.
+
+        As in :py:class:`BreadthFirstIterator`, nodes with the same value
+        are processed in the order they became active.
+        """
+        assert self.ordered
+        if self._order is None:
+            # activation order: roots first, then the children of each
+            # node, when it is processed. Children have larger values than
+            # their parents, so the order of tied nodes is settled from
+            # the lowest values upwards, in as many passes as needed.
+            keys = np.arange(len(self.values))
+            order = np.lexsort((keys, self.values))
+            while True:
+                keys[self._children_in_order(order)] = np.arange(self.nroots, len(self.values))
+                new_order = np.lexsort((keys, self.values))
+                if (new_order == order).all():
+                    break
+                order = new_order
+            self._order = order
+        return self._order
+
+    def widths(self):
+        """Get number of active nodes when each node is processed (in processing order)."""
+        order = self.processing_order()
+        # each processed node is replaced by its children
+        return self.nroots + np.cumsum(self.nchildren[order] - 1) - (self.nchildren[order] - 1)
+
+    def count_between(self, lo, hi):
+        """Build basic tree statistics, like :py:func:`count_tree_between`."""
+        order = self.processing_order()
+        widths = self.widths()
+        mask = np.logical_and(self.values[order] >= lo, self.values[order] <= hi)
+        nnodes = int(mask.sum())
+        maxwidth = int(widths[mask].max()) if nnodes > 0 else 0
+        return nnodes, maxwidth
+
+    def find_nodes_before(self, value):
+        """Identify all nodes that have children above value, like :py:func:`find_nodes_before`.
+
+        Returns
+        --------
+        parents: array of ints
+            node indices, -1 for the tree root.
+        weights: array of floats
+            number of forks experienced
+
+        """
+        big_child = self.child_max >= value
+        # nodes reached by the exploration: their parents did not stop it
+        explored = self._propagate(
+            self.values[:self.nroots] < value,
+            lambda parent_explored, parents: np.logical_and(parent_explored, ~big_child[parents]))
+        weights = self._propagate(
+            np.ones(self.nroots),
+            lambda parent_weights, parents: parent_weights * self.nchildren[parents])
+        selected = np.where(np.logical_and(explored, big_child))[0]
+        rank = np.empty(len(self.values), dtype=int)
+        rank[self.processing_order()] = np.arange(len(self.values))
+        selected = selected[np.argsort(rank[selected])]
+        parents = selected
+        parent_weights = weights[selected]
+        if (self.values[:self.nroots] >= value).any():
+            # already past (root child)
+            parents = np.append(parents, -1)
+            parent_weights = np.append(parent_weights, 1.)
+        return parents, parent_weights
+
+    def edges(self):
+        """Get parent id, child id, child value of each edge, in processing order."""
+        order = self.processing_order()
+        children = self._children_in_order(order)
+        parents = order[self.nchildren[order] > 0]
+        return np.repeat(self.ids[parents], self.nchildren[parents]), self.ids[children], self.values[children]
+
+
+class ArrayBreadthFirstIterator(object):
+    """Explore an :py:class:`ArrayTree`, like :py:class:`BreadthFirstIterator`.
+
+    The processing order is computed beforehand, so no priority queue
+    is needed. The active node properties are kept in arrays of the
+    maximum width of the tree, which are updated in place.
+    The tree has to be ``ordered``, and created with its TreeNodes
+    (see :py:meth:`ArrayTree.from_roots`), which are returned.
+    """
+
+    def __init__(self, tree):
+        """Start with the roots of ArrayTree *tree*."""
+        assert tree.ordered
+        assert tree.nodes is not None
+        self.tree = tree
+        # python lists are faster than arrays for accessing single elements
+        self.order = tree.processing_order().tolist()
+        self._node_values = tree.values.tolist()
+        self._node_ids = tree.ids.tolist()
+        self._node_root_ids = tree.root_ids().tolist()
+        self._nchildren = tree.nchildren.tolist()
+        self._child_offsets = tree.child_offsets.tolist()
+        self.reset()
+
+    def reset(self):
+        """(Re)start exploration from the top."""
+        tree = self.tree
+        nroots = tree.nroots
+        capacity = max(nroots, int(tree.widths().max()) if len(tree) > 0 else 0)
+        self.active_nodes = list(tree.nodes[:nroots])
+        self.nactive = nroots
+        self._values = np.empty(capacity)
+        self._root_ids = np.empty(capacity, dtype=int)
+        self._active_ids = np.empty(capacity, dtype=int)
+        self._values[:nroots] = tree.values[:nroots]
+        self._root_ids[:nroots] = np.arange(nroots)
+        self._active_ids[:nroots] = tree.ids[:nroots]
+        # slot of each tree node in the active arrays, -1 if not active
+        self._slots = list(range(nroots)) + [-1] * (len(tree) - nroots)
+        # tree node in each slot
+        self._slot_nodes = list(range(nroots)) + [-1] * (capacity - nroots)
+        self.position = 0
+
+    @property
+    def active_node_values(self):
+        """Values of the active nodes."""
+        return self._values[:self.nactive]
+
+    @property
+    def active_root_ids(self):
+        """Root ids of the active nodes."""
+        return self._root_ids[:self.nactive]
+
+    @property
+    def active_node_ids(self):
+        """Ids of the active nodes."""
+        return self._active_ids[:self.nactive]
+
+    def next_node(self):
+        """Get next node in order.
+
+        Does not remove the node from active set.
+
+        Returns
+        --------
+        None if done.
+        rootid, node, (active_nodes, active_root_ids, active_node_values, active_node_ids)
+        otherwise
+
+        """
+        # skip nodes below dropped nodes, which never became active
+        while self.position < len(self.order) and self._slots[self.order[self.position]] == -1:
+            self.position += 1
+        if self.position == len(self.order):
+            return None
+        i = self.order[self.position]
+        rootid = self._node_root_ids[i]
+        return rootid, self.tree.nodes[i], (self.active_nodes, self.active_root_ids, self.active_node_values, self.active_node_ids)
+
+    def _set_slot(self, slot, i):
+        """Put tree node *i* into *slot*."""
+        self.active_nodes[slot] = self.tree.nodes[i]
+        self._values[slot] = self._node_values[i]
+        self._root_ids[slot] = self._node_root_ids[i]
+        self._active_ids[slot] = self._node_ids[i]
+        self._slots[i] = slot
+        self._slot_nodes[slot] = i
+
+    def _remove_slot(self, slot):
+        """Remove *slot*, by moving the last slot into it."""
+        last = self.nactive - 1
+        if slot != last:
+            self._set_slot(slot, self._slot_nodes[last])
+        self.active_nodes.pop()
+        self.nactive -= 1
+
+    def _pop_next(self):
+        """Deactivate the next node, return its index and slot."""
+        i = self.order[self.position]
+        self.position += 1
+        slot = self._slots[i]
+        self._slots[i] = -1
+        return i, slot
+
+    def drop_next_node(self):
+        """Forget the current node."""
+        _, slot = self._pop_next()
+        self._remove_slot(slot)
+
+    def expand_children_of(self, rootid, node):
+        """Replace the current node with its children.
+
+        rootid and node have to come from the most recent call to next_node.
+        """
+        i, slot = self._pop_next()
+        assert self.tree.nodes[i] is node
+        nchildren = self._nchildren[i]
+        assert nchildren == len(node.children), 'tree was modified'
+        first = self._child_offsets[i]
+        if nchildren == 1:
+            self._set_slot(slot, first)
+        else:
+            self._remove_slot(slot)
+            for child in range(first, first + nchildren):
+                self.active_nodes.append(None)
+                self.nactive += 1
+                self._set_slot(self.nactive - 1, child)
 
 
 def _stringify_lanes(lanes, char='║'):
@@ -209,21 +601,25 @@ def dump_tree(filename, roots, pointpile):
     """Write a copy of the tree to a HDF5 file."""
     import h5py
 
-    nodes_from_ids = []
-    nodes_to_ids = []
-    nodes_values = []
-
-    explorer = BreadthFirstIterator(roots)
-    while True:
-        next_node = explorer.next_node()
-        if next_node is None:
-            break
-        rootid, node, (active_nodes, active_rootids, active_values, active_nodeids) = next_node
-        for c in node.children:
-            nodes_from_ids.append(node.id)
-            nodes_to_ids.append(c.id)
-            nodes_values.append(c.value)
-        explorer.expand_children_of(rootid, node)
+    tree = ArrayTree.from_roots(roots)
+    if tree.ordered:
+        nodes_from_ids, nodes_to_ids, nodes_values = tree.edges()
+    else:
+        nodes_from_ids = []
+        nodes_to_ids = []
+        nodes_values = []
+
+        explorer = BreadthFirstIterator(roots)
+        while True:
+            next_node = explorer.next_node()
+            if next_node is None:
+                break
+            rootid, node, (active_nodes, active_rootids, active_values, active_nodeids) = next_node
+            for c in node.children:
+                nodes_from_ids.append(node.id)
+                nodes_to_ids.append(c.id)
+                nodes_values.append(c.value)
+            explorer.expand_children_of(rootid, node)
 
     with h5py.File(filename, 'w') as f:
         f.create_dataset('unit_points', data=pointpile.us[:pointpile.nrows,:], compression='gzip', shuffle=True)
@@ -261,6 +657,10 @@ def count_tree_between(roots, lo, hi):
         the maximum number of parallel edges
 
     """
+    tree = ArrayTree.from_roots(roots)
+    if tree.ordered:
+        return tree.count_between(lo, hi)
+
     explorer = BreadthFirstIterator(roots)
     nnodes = 0
     maxwidth = 0
@@ -300,6 +700,12 @@ def find_nodes_before(root, value):
 
     """
     roots = root.children
+    tree = ArrayTree.from_roots(roots)
+    if tree.ordered:
+        indices, weights = tree.find_nodes_before(value)
+        parents = [root if i == -1 else tree.nodes[i] for i in indices]
+        return parents, weights.tolist()
+
     parents = []
     parent_weights = []
 
@@ -347,7 +753,8 @@ class PointPile(object):
         pdim: int
             number of physical (and derived) parameters
         chunksize: int
-            the point pile grows as needed, in these intervals.
+            initial number of points the point pile has space for.
+            The point pile grows as needed, by doubling its size.
 
         """
         self.nrows = 0
@@ -357,11 +764,22 @@ class PointPile(object):
         self.udim = udim
         self.pdim = pdim
 
+    def reserve(self, nrows):
+        """Make space for a total of at least `nrows` points."""
+        if nrows <= self.us.shape[0]:
+            return
+        # grow geometrically, so that the copying costs are amortized
+        newsize = max(nrows, 2 * self.us.shape[0])
+        us = np.zeros((newsize, self.udim))
+        ps = np.zeros((newsize, self.pdim))
+        us[:self.nrows,:] = self.us[:self.nrows,:]
+        ps[:self.nrows,:] = self.ps[:self.nrows,:]
+        self.us = us
+        self.ps = ps
+
     def add(self, newpointu, newpointp):
         """Save point `newpointu` (cube) / `newpointp` (parameters)."""
-        if self.nrows >= self.us.shape[0]:
-            self.us = np.concatenate((self.us, np.zeros((self.chunksize, self.udim))))
-            self.ps = np.concatenate((self.ps, np.zeros((self.chunksize, self.pdim))))
+        self.reserve(self.nrows + 1)
         assert len(newpointu) == self.us.shape[1], (newpointu, self.us.shape)
         assert len(newpointp) == self.ps.shape[1], (newpointp, self.ps.shape)
         self.us[self.nrows,:] = newpointu
@@ -369,6 +787,20 @@ class PointPile(object):
         self.nrows += 1
         return self.nrows - 1
 
+    def add_many(self, newpointsu, newpointsp):
+        """Save points `newpointsu` (cube) / `newpointsp` (parameters).
+
+        Returns the indices of the points.
+        """
+        n = len(newpointsu)
+        assert np.shape(newpointsu) == (n, self.udim), (np.shape(newpointsu), self.udim)
+        assert np.shape(newpointsp) == (n, self.pdim), (np.shape(newpointsp), self.pdim)
+        self.reserve(self.nrows + n)
+        self.us[self.nrows:self.nrows + n,:] = newpointsu
+        self.ps[self.nrows:self.nrows + n,:] = newpointsp
+        self.nrows += n
+        return np.arange(self.nrows - n, self.nrows)
+
     def getu(self, i):
         """Get cube point(s) with index(indices) `i`."""
         return self.us[i]
@@ -382,6 +814,11 @@ class PointPile(object):
         index = self.add(u, p)
         return TreeNode(value=value, id=index)
 
+    def make_nodes(self, values, us, ps):
+        """Save points `us` (cube) / `ps` (parameters), return a list of tree nodes."""
+        indices = self.add_many(us, ps)
+        return [TreeNode(value=value, id=index) for value, index in zip(values, indices.tolist())]
+
 
 class SingleCounter(object):
     """Evidence log(Z) and posterior weight summation for a Nested Sampling tree."""
@@ -504,12 +941,13 @@ class MultiCounter(object):
     - ``all_H``, ``all_logZ``, ``all_logVolremaining``, ``logweights``:
       information for all instances
       first entry is the main estimator, i.e., not bootstrapped
-    - ``istail``: whether that node was a leaf.
+    - ``istail``: whether that node was a leaf, and not replaced
+      by the children of the next node (see ``deferred_node_ids``).
     - ``nlive``: number of parallel arcs ("live points")
 
     """
 
-    def __init__(self, nroots, nbootstraps=10, random=False, check_insertion_order=False):
+    def __init__(self, nroots, nbootstraps=10, random=False, check_insertion_order=False, incremental=False):
         """Initialise counter.
 
         Parameters
@@ -521,6 +959,14 @@ class MultiCounter(object):
         random: bool
             if False, use mean estimator for volume shrinkage
             if True, draw a random sample
+        check_insertion_order: bool
+            whether to run the insertion order rank test
+        incremental: bool
+            if True, keep track of the number of live points of each
+            bootstrap instance, instead of counting them for every node.
+            Requires that every node of the exploration, starting at
+            the roots, is passed in order.
+            Then, only the insertion order of the main estimator is tested.
 
         """
         allyes = np.ones(nroots, dtype=bool)
@@ -537,18 +983,30 @@ class MultiCounter(object):
             self.rootids.append(mask)
         self.rootids = np.array(self.rootids)
         self.random = random
+        self.incremental = incremental
         self.ncounters = len(self.rootids)
 
         self.check_insertion_order = check_insertion_order
         self.insertion_order_threshold = 2
         self.insertion_order_accumulator = [UniformOrderAccumulator(self.rootids.shape[1]) for _ in range(self.rootids.shape[0])]
+        # if the caller knows that no two node values are the same,
+        # the live points do not need to be checked for ties
+        self.unique_values = False
+        # ids of leaves which were removed to be replaced together with
+        # the next expanded node (batch replacement). If that node has
+        # several children, these leaves are not counted as tail.
+        self.deferred_node_ids = set()
 
         self.reset(len(self.rootids))
 
     def reset(self, nentries):
         """Reset counters/integrator."""
-        self.logweights = []
-        self.istail = []
+        # weights of each iteration, grown as needed
+        self.niter = 0
+        self._logweights = np.empty((1000, nentries))
+        self._istail = np.empty(1000, dtype=bool)
+        # iterations of leaves since the last expansion
+        self._pending_tail = []
         self.logZ = -np.inf
         self.logZerr = np.inf
         self.all_H = -np.nan * np.ones(nentries)
@@ -565,6 +1023,33 @@ class MultiCounter(object):
 
         [acc.reset() for acc in self.insertion_order_accumulator]
         self.insertion_order_runs = [[] for _ in range(nentries)]
+        # number of live points in each bootstrap instance
+        self.all_nlive = self.rootids.sum(axis=1)
+
+    @property
+    def logweights(self):
+        """Log-weights of each iteration (rows) for all instances (columns)."""
+        return self._logweights[:self.niter]
+
+    @property
+    def istail(self):
+        """For each iteration, whether the node was a leaf."""
+        return self._istail[:self.niter]
+
+    def _add_logweights(self, logwidth, istail):
+        """Store log-weights *logwidth* of the current iteration."""
+        if self.niter >= len(self._istail):
+            # grow geometrically, so that the copying costs are amortized
+            capacity = 2 * len(self._istail)
+            logweights = np.empty((capacity, self._logweights.shape[1]))
+            logweights[:self.niter] = self._logweights[:self.niter]
+            self._logweights = logweights
+            istail_all = np.empty(capacity, dtype=bool)
+            istail_all[:self.niter] = self._istail[:self.niter]
+            self._istail = istail_all
+        self._logweights[self.niter] = logwidth
+        self._istail[self.niter] = istail
+        self.niter += 1
 
     @property
     def logZ_bs(self):
@@ -618,28 +1103,39 @@ class MultiCounter(object):
         # in which bootstraps is rootid?
         active = self.rootids[:,rootid]
         # how many live points does each bootstrap have?
-        nlive = self.rootids[:,rootids].sum(axis=1)
+        if self.incremental:
+            nlive = self.all_nlive
+        else:
+            nlive = self.rootids[:,rootids].sum(axis=1)
         nlive0 = nlive[0]
 
         if nchildren >= 1:
             # one arc terminates, another is spawned
 
+            # deferred leaves directly before a node with several children
+            # were replaced by them (batch replacement), so they are not tail
+            for _ in range(min(nchildren - 1, len(self._pending_tail))):
+                self._istail[self._pending_tail.pop()] = False
+            self._pending_tail = []
+
             # weight is the size of the slice off the volume
+            # bootstraps not containing this node can be out of live points
+            # (when several nodes are replaced at once); they are masked below
+            nlive_nonzero = np.maximum(nlive, 1)
             if self.random:
-                randompoint = np.random.beta(1, nlive, size=self.ncounters)
+                randompoint = np.random.beta(1, nlive_nonzero, size=self.ncounters)
                 logleft = log(randompoint)
                 logright = log1p(-randompoint)
                 logleft[0] = log1p(-exp(-1. / nlive0))
                 logright[0] = -1. / nlive0
             else:
-                logleft = log1p(-exp(-1. / nlive))
-                logright = -1. / nlive
+                logleft = log1p(-exp(-1. / nlive_nonzero))
+                logright = -1. / nlive_nonzero
 
             logwidth = logleft + self.all_logVolremaining
             logwidth[~active] = -np.inf
             wi = logwidth[active] + Li
-            self.logweights.append(logwidth)
-            self.istail.append(False)
+            self._add_logweights(logwidth, False)
 
             # print("updating continuation...", Li)
             assert active[0], (active, rootid)
@@ -681,7 +1177,16 @@ class MultiCounter(object):
             self.all_logVolremaining[active] += logright[active]
             self.logVolremaining = self.all_logVolremaining[0]
 
-            if self.check_insertion_order and len(np.unique(parallel_values)) == len(parallel_values):
+            if self.check_insertion_order and self.incremental:
+                # only the main estimator is used for the insertion order test
+                acc = self.insertion_order_accumulator[0]
+                if self.unique_values or len(np.unique(parallel_values)) == len(parallel_values):
+                    for child in node.children:
+                        acc.add((parallel_values < child.value).sum(), nlive0)
+                        if abs(acc.zscore) > self.insertion_order_threshold:
+                            self.insertion_order_runs[0].append(len(acc))
+                            acc.reset()
+            elif self.check_insertion_order and len(np.unique(parallel_values)) == len(parallel_values):
                 order_max = nlive.max() + 1
                 for i, acc in enumerate(self.insertion_order_accumulator):
                     if not active[i]:
@@ -705,8 +1210,9 @@ class MultiCounter(object):
             logwidth[active] = self.all_logVolremaining[active] - log(nlive[active])
             wi = logwidth + Li
 
-            self.logweights.append(logwidth)
-            self.istail.append(True)
+            if node.id in self.deferred_node_ids:
+                self._pending_tail.append(self.niter)
+            self._add_logweights(logwidth, True)
             self.all_logZ[active] = logaddexp(self.all_logZ[active], wi[active])
             self.logZ = self.all_logZ[0]
 
@@ -720,6 +1226,10 @@ class MultiCounter(object):
                 self.all_logVolremaining[active] += log1p(-1.0 / nlive[active])
             self.logVolremaining = self.all_logVolremaining[0]
 
+        if self.incremental:
+            # the node is replaced by its children
+            self.all_nlive = nlive + active * (nchildren - 1)
+
         V = self.all_logVolremaining - log(nlive0)
         Lmax = np.max(parallel_values)
         self.all_logZremain = V + log(np.sum(exp(parallel_values - Lmax))) + Lmax
@@ -730,8 +1240,35 @@ class MultiCounter(object):
             self.remainder_fraction = 1.0 / (1 + exp(self.logZ - self.logZremain))
 
 
+def _posterior_summary(samples, saved_u, saved_wt0):
+    """Summarize equally weighted posterior `samples`.
+
+    The information gain is computed from the weighted
+    points `saved_u` in the unit cube.
+    """
+    ndim = saved_u.shape[1]
+    information_gain_bits = []
+    for i in range(ndim):
+        H, _ = np.histogram(saved_u[:,i], weights=saved_wt0, density=True, bins=np.linspace(0, 1, 40))
+        information_gain_bits.append(float((np.log2(1 / ((H + 0.001) * 40)) / 40).sum()))
+
+    return dict(
+        mean=samples.mean(axis=0).tolist(),
+        stdev=samples.std(axis=0).tolist(),
+        median=np.percentile(samples, 50, axis=0).tolist(),
+        errlo=np.percentile(samples, 15.8655, axis=0).tolist(),
+        errup=np.percentile(samples, 84.1345, axis=0).tolist(),
+        information_gain_bits=information_gain_bits,
+    )
+
+
 def combine_results(saved_logl, saved_nodeids, pointpile, main_iterator, mpi_comm=None):
-    """Combine a sequence of likelihoods and nodes into a summary dictionary."""
+    """Combine a sequence of likelihoods and nodes into a summary dictionary.
+
+    The equally weighted posterior samples (``samples``) and
+    their summary (``posterior``) are computed when first accessed,
+    see :py:class:`ultranest.utils.LazyDict`.
+    """
 
     assert np.shape(main_iterator.logweights) == (len(saved_logl), len(main_iterator.all_logZ)), (
         np.shape(main_iterator.logweights),
@@ -741,7 +1278,7 @@ def combine_results(saved_logl, saved_nodeids, pointpile, main_iterator, mpi_com
     saved_logl = np.array(saved_logl)
     saved_u = pointpile.getu(saved_nodeids)
     saved_v = pointpile.getp(saved_nodeids)
-    saved_logwt = np.array(main_iterator.logweights)
+    saved_logwt = np.asarray(main_iterator.logweights)
     saved_logwt0 = saved_logwt[:,0]
     saved_logwt_bs = saved_logwt[:,1:]
     logZ_bs = main_iterator.all_logZ[1:]
@@ -772,17 +1309,10 @@ def combine_results(saved_logl, saved_nodeids, pointpile, main_iterator, mpi_com
 
     logzerr_bs = (logZ_bs - main_iterator.logZ).max()
     logzerr_total = (logzerr_tail**2 + logzerr_bs**2)**0.5
-    samples = resample_equal(saved_v, w)
-
-    ndim = saved_u.shape[1]
-    information_gain_bits = []
-    for i in range(ndim):
-        H, _ = np.histogram(saved_u[:,i], weights=saved_wt0, density=True, bins=np.linspace(0, 1, 40))
-        information_gain_bits.append(float((np.log2(1 / ((H + 0.001) * 40)) / 40).sum()))
 
     j = saved_logl.argmax()
 
-    results = dict(
+    results = LazyDict(
         niter=len(saved_logl),
         logz=main_iterator.logZ, logzerr=logzerr_total,
         logz_bs=logZ_bs.mean(),
@@ -791,24 +1321,19 @@ def combine_results(saved_logl, saved_nodeids, pointpile, main_iterator, mpi_com
         logzerr_bs=logzerr_bs,
         ess=ess,
         H=main_iterator.all_H[0], Herr=main_iterator.all_H.std(),
-        posterior=dict(
-            mean=samples.mean(axis=0).tolist(),
-            stdev=samples.std(axis=0).tolist(),
-            median=np.percentile(samples, 50, axis=0).tolist(),
-            errlo=np.percentile(samples, 15.8655, axis=0).tolist(),
-            errup=np.percentile(samples, 84.1345, axis=0).tolist(),
-            information_gain_bits=information_gain_bits,
-        ),
         weighted_samples=dict(
             upoints=saved_u, points=saved_v, weights=saved_wt0, logw=saved_logwt0,
             bootstrapped_weights=saved_wt_bs, logl=saved_logl),
-        samples=samples,
         maximum_likelihood=dict(
             logl=saved_logl[j],
             point=saved_v[j,:].tolist(),
             point_untransformed=saved_u[j,:].tolist(),
         ),
     )
+    # the equally weighted samples and posterior summaries
+    # are only computed when they are needed
+    results.set_lazy('samples', lambda: resample_equal(saved_v, w))
+    results.set_lazy('posterior', lambda: _posterior_summary(results['samples'], saved_u, saved_wt0))
 
     if getattr(main_iterator, 'check_insertion_order', False):
         results['insertion_order_MWW_test'] = dict(
@@ -819,21 +1344,34 @@ def combine_results(saved_logl, saved_nodeids, pointpile, main_iterator, mpi_com
     return results
 
 
-def logz_sequence(root, pointpile, nbootstraps=12, random=True, onNode=None, verbose=False, check_insertion_order=True):
+def logz_sequence(root, pointpile, nbootstraps=12, random=True, onNode=None, verbose=False, check_insertion_order=True, deferred_node_ids=()):
     """Run MultiCounter through tree `root`.
 
     Keeps track of, and returns ``(logz, logzerr, logv, nlive)``.
+
+    `deferred_node_ids` are the ids of leaves which were replaced
+    together with the next expanded node (see MultiCounter).
     """
     roots = root.children
 
     Lmax = -np.inf
 
-    explorer = BreadthFirstIterator(roots)
+    unique_values = False
+    if onNode is None:
+        tree = ArrayTree.from_roots(roots)
+        explorer = ArrayBreadthFirstIterator(tree) if tree.ordered else BreadthFirstIterator(roots)
+        unique_values = len(np.unique(tree.values)) == len(tree)
+    else:
+        # onNode may add children while the tree is explored
+        explorer = BreadthFirstIterator(roots)
     # Integrating thing
     main_iterator = MultiCounter(
         nroots=len(roots), nbootstraps=max(1, nbootstraps),
-        random=random, check_insertion_order=check_insertion_order)
+        random=random, check_insertion_order=check_insertion_order,
+        incremental=True)
     main_iterator.Lmax = max(Lmax, max(n.value for n in roots))
+    main_iterator.unique_values = unique_values
+    main_iterator.deferred_node_ids = deferred_node_ids
 
     logz = []
     logzerr = []
@@ -862,7 +1400,7 @@ def logz_sequence(root, pointpile, nbootstraps=12, random=True, onNode=None, ver
             logzerr.append(main_iterator.logZerr_bs)
 
         insert_order_value = 0.0
-        if len(np.unique(active_values)) == len(active_values) and len(node.children) > 0:
+        if len(node.children) > 0 and (unique_values or len(np.unique(active_values)) == len(active_values)):
             child_insertion_order = (active_values > node.children[0].value).sum()
             insert_order.append(2 * (child_insertion_order + 1.) / len(active_values))
         else:
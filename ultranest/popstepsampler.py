@@ -0,0 +1,229 @@
+"""Vectorized step samplers.
+
+The step samplers in :py:mod:`ultranest.stepsampler` advance a single
+chain, and make one likelihood call with a single point per iteration.
+This is ineffective for vectorized likelihood functions.
+
+The population step samplers implemented here advance many
+independent chains in lock-step. In each iteration, the proposals of all
+chains are evaluated with a single likelihood call. Up to one new,
+independent point per chain is returned at a time.
+"""
+
+from __future__ import print_function, division
+import numpy as np
+
+
+def generate_region_random_directions(us, region, scale=1):
+    """Draw a direction vector in a random direction of the region, for each point in `us`.
+
+    The vectors are drawn from a unit normal in the whitened space
+    of the region, and have length `scale` in unit cube space.
+    """
+    ts = region.transformLayer.transform(us)
+    tv = ts + np.random.normal(size=ts.shape)
+    v = region.transformLayer.untransform(tv) - us
+    v *= scale / ((v**2).sum(axis=1)**0.5).reshape((-1, 1))
+    return v
+
+
+class PopulationSliceSampler(object):
+    """Population of slice samplers, moving along random region directions.
+
+    `popsize` chains are advanced simultaneously. Each chain starts at a
+    randomly chosen live point, and performs `nsteps` slice sampling
+    steps (stepping out, then shrinking) in random directions
+    (see :py:func:`generate_region_random_directions`).
+    Then its final point is returned and the chain is restarted.
+
+    In each call, only one likelihood call is made, with
+    the proposals of all chains.
+    """
+
+    def __init__(self, popsize, nsteps, scale=1.0, region_filter=False, max_stepout=20):
+        """Initialise sampler.
+
+        Parameters
+        -----------
+        popsize: int
+            number of chains to advance in lock-step.
+            Make this similar to the number of points your
+            likelihood can evaluate efficiently in one call.
+
+        nsteps: int
+            number of accepted steps until the sample is considered independent.
+
+        scale: float
+            initial length of the slice interval, in unit cube space.
+            This is adapted so that stepping out is rarely needed.
+
+        region_filter: bool
+            if True, use region to check if a proposed point can be inside
+            before calling likelihood.
+
+        max_stepout: int
+            maximum number of interval doublings when stepping out.
+        """
+        self.popsize = int(popsize)
+        self.nsteps = int(nsteps)
+        self.scale = scale
+        self.region_filter = region_filter
+        self.max_stepout = max_stepout
+        self.nudge = 1.1
+        self.reset()
+
+    def __str__(self):
+        """Get string representation."""
+        return type(self).__name__ + '(popsize=%d, nsteps=%d)' % (self.popsize, self.nsteps)
+
+    def reset(self):
+        """Forget the state of all chains."""
+        self.u = None
+        self.p = None
+        # chains with L=-inf are restarted from a live point
+        self.L = np.zeros(self.popsize) - np.inf
+        self.nsteps_done = np.zeros(self.popsize, dtype=int)
+        self.v = None
+        self.left = np.zeros(self.popsize)
+        self.right = np.zeros(self.popsize)
+        self.t = np.zeros(self.popsize)
+        # stage of the slice sampling step:
+        # 0: stepping out to the left, 1: stepping out to the right, 2: shrinking
+        self.stage = np.zeros(self.popsize, dtype=int)
+        self.nstepout = np.zeros(self.popsize, dtype=int)
+
+    def region_changed(self, Ls, region):
+        """React to change of region."""
+        pass
+
+    def _start_chains(self, mask, region, Lmin, us, Ls, transform):
+        """Restart chains in `mask` from randomly chosen live points above `Lmin`."""
+        candidates = np.where(Ls > Lmin)[0]
+        if len(candidates) == 0:
+            candidates = np.arange(len(Ls))
+        i = candidates[np.random.randint(len(candidates), size=mask.sum())]
+        if self.u is None:
+            self.u = np.empty((self.popsize, us.shape[1]))
+            self.v = np.empty((self.popsize, us.shape[1]))
+            self.p = None
+        self.u[mask] = us[i,:]
+        self.L[mask] = Ls[i]
+        p = transform(us[i,:])
+        if self.p is None:
+            self.p = np.empty((self.popsize, p.shape[1]))
+        self.p[mask] = p
+        self.nsteps_done[mask] = 0
+        self._new_intervals(mask, region)
+
+    def _new_intervals(self, mask, region):
+        """Start a new slice sampling step for the chains in `mask`."""
+        if mask.any():
+            self.v[mask] = generate_region_random_directions(self.u[mask], region, scale=self.scale)
+        self.left[mask] = -1.0
+        self.right[mask] = 1.0
+        self.stage[mask] = 0
+        self.nstepout[mask] = 0
+
+    def __next__(self, region, Lmin, us, Ls, transform, loglike, ndraw=None, plot=False, tregion=None):
+        """Advance all chains by one proposal.
+
+        Parameters
+        ----------
+        region: MLFriends
+            region.
+        Lmin: float
+            loglikelihood threshold
+        us: array of vectors
+            current live points
+        Ls: array of floats
+            current live point likelihoods
+        transform: function
+            transform function
+        loglike: function
+            loglikelihood function
+        ndraw: int
+            not used.
+        plot: bool
+            not used.
+        tregion: WrappingEllipsoid
+            optional ellipsoid in transformed space for rejecting proposals
+
+        Returns
+        --------
+        u: array of vectors or None
+            new independent points, None if no chain has finished.
+        p: array of vectors or None
+            their transformed coordinates
+        L: array of floats or None
+            their likelihoods
+        nc: int
+            number of likelihood function evaluations made.
+        """
+        # (re)start chains which have not started or are below the current threshold
+        restart = ~(self.L > Lmin)
+        if restart.any():
+            self._start_chains(restart, region, Lmin, us, Ls, transform)
+
+        # propose one point for every chain
+        stage = self.stage.copy()
+        self.t = np.where(stage == 0, self.left, np.where(stage == 1, self.right,
+            np.random.uniform(self.left, self.right)))
+        unew = self.u + self.v * self.t.reshape((-1, 1))
+
+        # filter out points which can not be accepted
+        mask = np.logical_and(unew > 0, unew < 1).all(axis=1)
+        if self.region_filter and mask.any():
+            mask[mask] = region.inside(unew[mask,:])
+        pnew = np.empty_like(self.p)
+        if mask.any():
+            pnew[mask] = transform(unew[mask,:])
+        if tregion is not None and mask.any():
+            mask[mask] = tregion.inside(pnew[mask,:])
+
+        Lnew = np.zeros(self.popsize) - np.inf
+        nc = mask.sum()
+        if nc > 0:
+            Lnew[mask] = loglike(pnew[mask,:])
+        accepted = Lnew > Lmin
+
+        # stepping out: extend the interval, or move to the next stage
+        stepout = stage < 2
+        extend = np.logical_and(stepout, accepted)
+        self.nstepout[extend] += 1
+        extend = np.logical_and(extend, self.nstepout <= self.max_stepout)
+        self.left[np.logical_and(extend, stage == 0)] *= 2
+        self.right[np.logical_and(extend, stage == 1)] *= 2
+        found_border = np.logical_and(stepout, ~extend)
+        self.stage[found_border] += 1
+        # each side has its own stepping out budget
+        self.nstepout[found_border] = 0
+
+        # adapt scale to how much stepping out was necessary
+        found_right = np.logical_and(found_border, stage == 1)
+        if found_right.any():
+            expanded = np.logical_or(self.left[found_right] < -1, self.right[found_right] > 1)
+            self.scale *= self.nudge**((expanded.sum() - (~expanded).sum()) / self.popsize)
+
+        # shrinking: move if accepted, otherwise shrink the interval towards the current point
+        shrinking = stage == 2
+        moved = np.logical_and(shrinking, accepted)
+        rejected = np.logical_and(shrinking, ~accepted)
+        self.left[np.logical_and(rejected, self.t < 0)] = self.t[np.logical_and(rejected, self.t < 0)]
+        self.right[np.logical_and(rejected, self.t > 0)] = self.t[np.logical_and(rejected, self.t > 0)]
+        self.u[moved] = unew[moved]
+        self.p[moved] = pnew[moved]
+        self.L[moved] = Lnew[moved]
+        self.nsteps_done[moved] += 1
+        self._new_intervals(moved, region)
+
+        # chains which have made enough steps, are returned
+        finished = self.nsteps_done >= self.nsteps
+        if not finished.any():
+            return None, None, None, nc
+
+        u = self.u[finished].copy()
+        p = self.p[finished].copy()
+        L = self.L[finished].copy()
+        # mark for restarting
+        self.L[finished] = -np.inf
+        return u, p, L, nc
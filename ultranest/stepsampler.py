@@ -881,117 +881,140 @@ def crop_bracket_at_unit_cube(ui, v, left, right, epsilon=1e-6):
 def _prepare_steps(
     nsteps_done, nsteps, directions, ndraw,
     current_interval, loglike, transform, region, ndim, region_filter, 
-    Lmin, verbose,
+    Lmin, verbose, debug=False, nblock=16,
 ):
+    """Prepare a sequence of slice proposals, predicting which are accepted.
+
+    Along each direction, proposals are drawn from the ellipsoid bracket
+    until one is predicted to be inside the likelihood contour.
+    Predicted rejections shrink the bracket, as in slice sampling.
+
+    The proposals along a direction are drawn `nblock` at a time in
+    the current bracket. A proposal is only used if it lies inside the
+    bracket shrunk by the preceding proposals, which makes it uniformly
+    distributed in that bracket, just like drawing one at a time.
+
+    If `debug`, the consistency of the current point and the proposals
+    is asserted, which needs region and likelihood evaluations.
+    """
     point_sequence = []
     point_expectation = []
     intervals = []
     nsteps_prepared = 0
+    ucurrent, left, right = current_interval
+    if debug:
+        assert region.inside_ellipsoid(ucurrent.reshape((1, ndim))), (
+            'cannot start from outside ellipsoid!', region.inside_ellipsoid(ucurrent.reshape((1, ndim))))
+        if region_filter:
+            assert region.inside(ucurrent.reshape((1, ndim))), (
+                'cannot start from outside region!', region.inside(ucurrent.reshape((1, ndim))))
+        assert loglike(transform(ucurrent.reshape((1, ndim)))) >= Lmin, (
+            'cannot start from outside!', loglike(transform(ucurrent.reshape((1, ndim)))), Lmin)
+
     while nsteps_prepared + nsteps_done < nsteps and len(point_sequence) < ndraw:
-        if verbose:
-            print("loop:", nsteps_prepared, nsteps_done, 'of', nsteps)
         v = directions[nsteps_done + nsteps_prepared]
         if verbose:
-            print("direction:", v)
-        if len(point_sequence) == 0:
-            ucurrent, left, right = current_interval
+            print("preparing step: %d from %s, direction: %s" % (nsteps_prepared + nsteps_done, ucurrent, v))
+        if debug:
             assert (ucurrent >= 0).all(), ucurrent
             assert (ucurrent <= 1).all(), ucurrent
-            assert region.inside_ellipsoid(ucurrent.reshape((1, ndim))), (
-                'cannot start from outside ellipsoid!', region.inside_ellipsoid(ucurrent.reshape((1, ndim))))
-            if region_filter:
-                assert region.inside(ucurrent.reshape((1, ndim))), (
-                    'cannot start from outside region!', region.inside(ucurrent.reshape((1, ndim))))
-            assert loglike(transform(ucurrent.reshape((1, ndim)))) >= Lmin, (
-                'cannot start from outside!', loglike(transform(ucurrent.reshape((1, ndim)))), Lmin)
-        else:
-            left, right = None, None
-        assert (ucurrent >= 0).all(), ucurrent
-        assert (ucurrent <= 1).all(), ucurrent
-        if verbose:
-            print("preparing step: %d from %s" % (nsteps_prepared + nsteps_done, ucurrent))
+            assert region.inside_ellipsoid(ucurrent.reshape((1, ndim))), ('current point outside ellipsoid!')
+
+        # distance to center in normalised coordinates, d . invcov . d,
+        # is a quadratic function along the line: r = r0 + r1 * t + r2 * t^2
+        d = ucurrent - region.ellipsoid_center
+        invcov_d = np.dot(region.ellipsoid_invcov, d)
+        r0 = np.dot(d, invcov_d)
+        r1 = 2 * np.dot(v, invcov_d)
+        r2 = np.dot(v, np.dot(region.ellipsoid_invcov, v))
+        # project ellipsoid center onto line
+        # region.ellipsoid_center = ucurrent + tc * v
+        # current point is at 0 by definition
+        tc = -np.dot(d, v)
 
         if left is None or right is None:
-            # in each, find the end points using the expanded ellipsoid
-            assert region.inside_ellipsoid(ucurrent.reshape((1, ndim))), ('current point outside ellipsoid!')
-            left, right = ellipsoid_bracket(ucurrent, v, region.ellipsoid_center, region.ellipsoid_inv_axes, region.enlarge)
+            # in each, find the end points using the expanded ellipsoid,
+            # where r = region.enlarge (see ellipsoid_bracket)
+            c = r0 - region.enlarge
+            assert c <= 0, ("outside ellipsoid", c)
+            intersect = r1**2 - 4 * r2 * c
+            assert intersect >= 0, ("no intersection", intersect, c)
+            left = min(0, (-r1 - intersect**0.5) / (2 * r2))
+            right = max(0, (-r1 + intersect**0.5) / (2 * r2))
             left, right, _, _ = crop_bracket_at_unit_cube(ucurrent, v, left, right)
-            assert (ucurrent + v * left <= 1).all(), (
-                ucurrent, v, region.ellipsoid_center, region.ellipsoid_inv_axes, region.ellipsoid_invcov, region.enlarge)
-            assert (ucurrent + v * right <= 1).all(), (
-                ucurrent, v, region.ellipsoid_center, region.ellipsoid_inv_axes, region.ellipsoid_invcov, region.enlarge)
-            assert (ucurrent + v * left >= 0).all(), (
-                ucurrent, v, region.ellipsoid_center, region.ellipsoid_inv_axes, region.ellipsoid_invcov, region.enlarge)
-            assert (ucurrent + v * right >= 0).all(), (
-                ucurrent, v, region.ellipsoid_center, region.ellipsoid_inv_axes, region.ellipsoid_invcov, region.enlarge)
-
+            if debug:
+                for tend in left, right:
+                    assert (ucurrent + v * tend <= 1).all(), (
+                        ucurrent, v, region.ellipsoid_center, region.ellipsoid_inv_axes, region.ellipsoid_invcov, region.enlarge)
+                    assert (ucurrent + v * tend >= 0).all(), (
+                        ucurrent, v, region.ellipsoid_center, region.ellipsoid_inv_axes, region.ellipsoid_invcov, region.enlarge)
             assert left <= 0 <= right, (left, right)
             if verbose:
                 print("   ellipsoid bracket found:", left, right)
 
-        while True:
-            # sample in each a point until presumed success:
-            assert region.inside_ellipsoid(ucurrent.reshape((1, ndim))), ('current point outside ellipsoid!')
-            t = np.random.uniform(left, right)
-            unext = ucurrent + v * t
-            assert (unext >= 0).all(), unext
-            assert (unext <= 1).all(), unext
-            assert region.inside_ellipsoid(unext.reshape((1, ndim))), ('proposal landed outside ellipsoid!', t, left, right)
-
-            # compute distance vector to center
-            d = unext - region.ellipsoid_center
-            # distance in normalised coordates: vector . matrix . vector
-            # where the matrix is the ellipsoid inverse covariance
-            r = np.einsum('j,jk,k->', d, region.ellipsoid_invcov, d)
-            if verbose:
-                print("   proposed slice point", t, r)
+        center_nearby = None
 
+        lefts = np.empty(nblock)
+        rights = np.empty(nblock)
+        while True:
+            t = np.random.uniform(left, right, size=nblock)
+            # brackets in which each proposal would have been drawn,
+            # shrunk by all preceding proposals
+            lefts[0] = left
+            rights[0] = right
+            np.maximum.accumulate(np.where(t[:-1] > 0, left, t[:-1]), out=lefts[1:])
+            np.minimum.accumulate(np.where(t[:-1] > 0, t[:-1], right), out=rights[1:])
+            np.maximum(lefts, left, out=lefts)
+            np.minimum(rights, right, out=rights)
+            used = np.logical_and(t >= lefts, t <= rights)
+
+            r = r0 + t * (r1 + t * r2)
+            #   If point radius in ellipsoid is <1, presume that it will be successful
             likely_inside = r <= 1
-            if not likely_inside and r <= region.enlarge:
+            maybe_inside = np.logical_and(~likely_inside, r <= region.enlarge)
+            if maybe_inside.any():
                 # The exception is, when a point is between projected ellipsoid center and current point
                 # then it is also likely inside (if still inside the ellipsoid)
-
-                # project ellipsoid center onto line
-                # region.ellipsoid_center = ucurrent + tc * v
-                tc = np.dot(region.ellipsoid_center - ucurrent, v)
-                # current point is at 0 by definition
-                if 0 < t < tc or tc < t < 0:
-                    if verbose:
-                        print("   proposed point is further inside than current point")
-                    likely_inside = True
-                #    print("   proposed point %.3f is going towards center %.3f" % (t, tc))
-                # else:
-                #    print("   proposed point %.3f is going away from center %.3f" % (t, tc))
-                else:
+                further_inside = np.logical_or(
+                    np.logical_and(0 < t, t < tc), np.logical_and(tc < t, t < 0))
+                likely_inside[np.logical_and(maybe_inside, further_inside)] = True
+                if center_nearby is None and np.logical_and(maybe_inside, ~further_inside)[used].any():
                     # another exception is that points very close to the current point
                     # are very likely also inside
                     # to find that out, project all live points on the line
                     tall = np.einsum('ij,j->i', region.u - ucurrent, v)
                     # find the range and identify a small part of it
                     epsilon_nearby = 1e-6
-                    if tc < (tall.max() - tall.min()) * epsilon_nearby:
-                        likely_inside = True
-                        if verbose:
-                            print("   proposed point is very nearby")
-
+                    center_nearby = tc < (tall.max() - tall.min()) * epsilon_nearby
+                if center_nearby:
+                    likely_inside[maybe_inside] = True
+
+            indices = np.where(used)[0]
+            accepted = indices[likely_inside[indices]]
+            if len(accepted) > 0:
+                indices = indices[indices <= accepted[0]]
+            for i in indices:
+                intervals.append((nsteps_prepared, ucurrent, v, lefts[i], rights[i], t[i]))
+                point_sequence.append(ucurrent + v * t[i])
+                point_expectation.append(likely_inside[i])
             if verbose:
-                print("   proposed point %s (%f) is likely %s (r=%f)" % (unext, t, 'inside' if likely_inside else 'outside', r))
-            intervals.append((nsteps_prepared, ucurrent, v, left, right, t))
-            point_sequence.append(unext)
-            point_expectation.append(likely_inside)
-            #   If point radius in ellipsoid is <1, presume that it will be successful
-            if likely_inside:
+                print("   proposed slice points %s are likely %s" % (t[indices], likely_inside[indices]))
+            if debug:
+                unext = ucurrent + v * t[indices].reshape((-1, 1))
+                assert (unext >= 0).all(), unext
+                assert (unext <= 1).all(), unext
+                assert region.inside_ellipsoid(unext).all(), ('proposal landed outside ellipsoid!', t, left, right)
+
+            if len(accepted) > 0:
                 nsteps_prepared += 1
-                ucurrent = unext
-                assert region.inside_ellipsoid(ucurrent.reshape((1, ndim))), ('current point outside ellipsoid!')
+                ucurrent = point_sequence[-1]
+                left, right = None, None
                 break
 
-            #   Else, presume it will be unsuccessful, and sample another point
-            #   shrink interval
-            if t > 0:
-                right = t
-            else:
-                left = t
+            #   Else, presume they will be unsuccessful, and continue
+            #   in the shrunk interval
+            left = max(left, t[t <= 0].max(initial=left))
+            right = min(right, t[t > 0].min(initial=right))
 
     assert len(point_sequence) == len(point_expectation)
     assert len(point_sequence) == len(intervals)
@@ -1081,7 +1104,7 @@ class AHARMSampler(StepSampler):
     def __init__(
         self, nsteps, adaptive_nsteps=False, max_nsteps=1000,
         region_filter=False, log=False, direction=generate_region_random_direction,
-        orthogonalise=True,
+        orthogonalise=True, debug=False,
     ):
         """Initialise vectorised hit-and-run/slice sampler.
 
@@ -1121,6 +1144,12 @@ class AHARMSampler(StepSampler):
             proposal scale, number of steps, jump distance and distance
             between live points
 
+        debug: bool
+            If true, check in every step that the current point and the
+            proposals are consistent with the region and likelihood.
+            This is slow, because it requires additional region and
+            likelihood evaluations.
+
         """
         self.history = []
         self.nsteps = nsteps
@@ -1128,6 +1157,7 @@ class AHARMSampler(StepSampler):
         self.max_nsteps = max_nsteps
         self.last = None, None
         self.generate_direction = direction
+        self.debug = debug
         adaptive_nsteps_options = [
             False,
             'move-distance', 'move-distance-midway',
@@ -1248,7 +1278,7 @@ class AHARMSampler(StepSampler):
             point_sequence, point_expectation, intervals, nsteps_prepared = _prepare_steps(
                 self.nsteps_done, self.nsteps, self.directions, ndraw,
                 self.current_interval, loglike, transform, region, ndim, self.region_filter, 
-                Lmin, verbose
+                Lmin, verbose, debug=self.debug
             )
             point_sequence, t_point_sequence, L, Lmask, indices_deviating, nc_here, truncated = _evaluate_with_filter(
                 self.region_filter, loglike, transform, Lmin, region, tregion,
@@ -1285,7 +1315,7 @@ class AHARMSampler(StepSampler):
                 assert (ucurrent >= 0).all(), ucurrent
                 assert (ucurrent <= 1).all(), ucurrent
                 self.current_interval = ucurrent, None, None
-                if self.region_filter:
+                if self.debug and self.region_filter:
                     assert region.inside(ucurrent.reshape((1, ndim))), ('suggested point outside region!', region.inside(ucurrent.reshape((1, ndim))))
             else:
                 # point i unexpectedly inside or outside
@@ -1293,7 +1323,7 @@ class AHARMSampler(StepSampler):
                 for ui, Li in zip(point_sequence[:imax][Lmask[:imax]], L[:imax][Lmask[:imax]]):
                     self.history.append((ui, Li))
                 nsteps_prepared, ucurrent, v, left, right, t = intervals[imax]
-                if self.region_filter:
+                if self.debug and self.region_filter:
                     assert region.inside(ucurrent.reshape((1, ndim))), ('suggested point outside region!', region.inside(ucurrent.reshape((1, ndim))))
                 assert (ucurrent >= 0).all(), ucurrent
                 assert (ucurrent <= 1).all(), ucurrent
@@ -1317,7 +1347,7 @@ class AHARMSampler(StepSampler):
                     if imax == len(point_sequence) - 1 and truncated:
                         assert False
                     ucurrent = point_sequence[imax]
-                    if self.region_filter:
+                    if self.debug and self.region_filter:
                         assert region.inside(ucurrent.reshape((1, ndim))), ('accepted point outside region!', region.inside(ucurrent.reshape((1, ndim))))
                     # expected point to lie outside, but actually inside
                     # adopt as point and continue
@@ -11,6 +11,122 @@ from __future__ import print_function, division
 import numpy as np
 import warnings
 import os
+import time
+
+
+class PointStack(object):
+    r"""Stored points, searchable by likelihood threshold.
+
+    Rows are [Lmin, L, \*otherinfo]. The rows are split into blocks,
+    and for each block a lower bound on Lmin and an upper bound on L
+    of the rows not yet taken is kept. This allows skipping blocks
+    which cannot contain a matching row.
+    """
+
+    def __init__(self, rows, block_size=None):
+        """Initialise with *rows*, a 2d array.
+
+        *rows* can also be a 2d array-like, for example a h5py dataset.
+        Then only the Lmin and L columns are read into memory, and
+        the other values are read when the row is taken.
+
+        *block_size* is the number of rows in each block.
+        By default, the square root of the number of rows.
+        """
+        if not hasattr(rows, 'shape'):
+            rows = np.asarray(rows, dtype=float)
+        self.rows = rows
+        assert len(self.rows.shape) == 2, self.rows.shape
+        nrows = self.rows.shape[0]
+        self.Lmins = np.array(self.rows[:,0], dtype=float)
+        self.Ls = np.array(self.rows[:,1], dtype=float)
+        self.alive = np.ones(nrows, dtype=bool)
+        self.nalive = nrows
+        if block_size is None:
+            block_size = max(64, int(nrows**0.5))
+        self.block_size = block_size
+        if nrows > 0:
+            # NaN entries can never match, ignore them
+            block_starts = np.arange(0, nrows, block_size)
+            self.block_Lmin = np.fmin.reduceat(self.Lmins, block_starts)
+            self.block_L = np.fmax.reduceat(self.Ls, block_starts)
+        else:
+            self.block_Lmin = np.empty(0)
+            self.block_L = np.empty(0)
+        # rows before this one are all taken
+        self.first_alive = 0
+
+    def __len__(self):
+        """Get number of rows not yet taken."""
+        return self.nalive
+
+    def __iter__(self):
+        """Iterate over (index, row) of rows not yet taken."""
+        for i in np.where(self.alive)[0]:
+            yield i, self.rows[i]
+
+    def __getitem__(self, i):
+        """Get (index, row) of the *i*-th row not yet taken."""
+        idx = np.where(self.alive)[0][i]
+        return idx, self.rows[idx]
+
+    def __repr__(self):
+        """Get string representation."""
+        return 'PointStack(%d of %d rows left)' % (self.nalive, len(self.alive))
+
+    def pop(self, Lmin):
+        """Take the first row sampled from <= Lmin with L > Lmin.
+
+        Returns
+        -------
+        index: int
+            index of the row, None if no row exists
+        row: array
+            row values, None if no row exists
+
+        """
+        if self.nalive == 0:
+            return None, None
+        # usually, the first remaining row matches
+        idx = self.first_alive
+        if self.Lmins[idx] <= Lmin < self.Ls[idx]:
+            self._remove(idx)
+            return idx, self.rows[idx]
+
+        first = idx // self.block_size
+        candidate_blocks = first + np.where(np.logical_and(
+            self.block_Lmin[first:] <= Lmin, self.block_L[first:] > Lmin))[0]
+        for b in candidate_blocks:
+            lo = b * self.block_size
+            hi = lo + self.block_size
+            alive = self.alive[lo:hi]
+            match = np.logical_and(alive, np.logical_and(
+                self.Lmins[lo:hi] <= Lmin, self.Ls[lo:hi] > Lmin))
+            hits = np.where(match)[0]
+            if len(hits) > 0:
+                idx = lo + hits[0]
+                self._remove(idx)
+                return idx, self.rows[idx]
+            # bounds were loose because of taken rows, tighten them
+            if alive.any():
+                self.block_Lmin[b] = np.fmin.reduce(self.Lmins[lo:hi][alive])
+                self.block_L[b] = np.fmax.reduce(self.Ls[lo:hi][alive])
+            else:
+                self.block_Lmin[b] = np.inf
+                self.block_L[b] = -np.inf
+
+        return None, None
+
+    def _remove(self, idx):
+        """Mark row *idx* as taken.
+
+        The block bounds remain valid (but loose) and are tightened lazily.
+        """
+        self.alive[idx] = False
+        self.nalive -= 1
+        if self.nalive > 0:
+            while not self.alive[self.first_alive]:
+                self.first_alive += 1
 
 
 class NullPointStore(object):
@@ -80,19 +196,12 @@ class FilePointStore(object):
         if self.stack_empty:
             return None, None
 
-        # look forward to see if there is an exact match
+        # look for an exact match
         # if we do not use the exact matches
         #   this causes a shift in the loglikelihoods
-        for i, (idx, next_row) in enumerate(self.stack):
-            row_Lmin = next_row[0]
-            L = next_row[1]
-            if row_Lmin <= Lmin and L > Lmin:
-                idx, row = self.stack.pop(i)
-                self.stack_empty = self.stack == []
-                return idx, row
-
+        idx, row = self.stack.pop(Lmin)
         self.stack_empty = len(self.stack) == 0
-        return None, None
+        return idx, row
 
 
 class TextPointStore(FilePointStore):
@@ -135,7 +244,7 @@ class TextPointStore(FilePointStore):
             except IOError:
                 pass
 
-        self.stack = list(enumerate(stack))
+        self.stack = PointStack(np.array(stack, dtype=float).reshape((-1, self.ncols)))
         self.ncalls = len(self.stack)
         self.reset()
 
@@ -149,6 +258,89 @@ class TextPointStore(FilePointStore):
         return self.nrows - 1
 
 
+class BinaryPointStore(FilePointStore):
+    """Storage in a binary file.
+
+    Stores previously drawn points above some likelihood contour,
+    so that they can be reused in another run.
+
+    The format is a header (8 magic bytes, then the number of columns
+    and the number of likelihood calls as little-endian 64-bit integers),
+    followed by the rows as little-endian 64-bit floats.
+    The file can be read with :py:func:`numpy.memmap`.
+    The number of likelihood calls is updated on :py:meth:`flush`
+    and :py:meth:`close`.
+    """
+    MAGIC = b'ULTRANPS'
+    HEADER_SIZE = 24
+
+    def __init__(self, filepath, ncols, mode='a'):
+        """Load and append to storage at *filepath*.
+
+        The file contains *ncols* columns (Lmin, L, and others).
+        If *mode* is 'w', the file is overwritten.
+        """
+        self.ncols = int(ncols)
+        self.stack_empty = True
+        if mode == 'w' or not os.path.exists(filepath) or os.path.getsize(filepath) == 0:
+            self.fileobj = open(filepath, 'w+b')
+            self.ncalls = 0
+            self._write_header()
+        else:
+            self.fileobj = open(filepath, 'r+b')
+        self._load(filepath)
+
+    def _write_header(self):
+        """Write header with the number of columns and calls."""
+        self.fileobj.seek(0)
+        self.fileobj.write(self.MAGIC)
+        self.fileobj.write(np.array([self.ncols, self.ncalls], dtype='<i8').tobytes())
+        self.fileobj.seek(0, os.SEEK_END)
+
+    def _load(self, filepath):
+        """Load from data file *filepath*."""
+        self.fileobj.seek(0)
+        header = self.fileobj.read(self.HEADER_SIZE)
+        if len(header) != self.HEADER_SIZE or header[:len(self.MAGIC)] != self.MAGIC:
+            raise IOError("Tried to resume from file '%s', which is not a binary point store!" % (filepath))
+        ncols, ncalls = np.frombuffer(header[len(self.MAGIC):], dtype='<i8')
+        if ncols != self.ncols:
+            raise IOError("Tried to resume from file '%s', which has a different number of columns!" % (filepath))
+        rowsize = 8 * self.ncols
+        self.nrows = (os.path.getsize(filepath) - self.HEADER_SIZE) // rowsize
+        # drop incomplete last row, for example from an interrupted write
+        self.fileobj.truncate(self.HEADER_SIZE + self.nrows * rowsize)
+        self.fileobj.seek(0, os.SEEK_END)
+        if self.nrows > 0:
+            points = np.memmap(filepath, dtype='<f8', mode='r', offset=self.HEADER_SIZE,
+                shape=(self.nrows, self.ncols))
+        else:
+            points = np.empty((0, self.ncols))
+        self.stack = PointStack(points)
+        self.ncalls = int(ncalls)
+        self.reset()
+
+    def add(self, row, ncalls):
+        r"""Add data point *row* = [Lmin, L, \*otherinfo] to storage."""
+        if len(row) != self.ncols:
+            raise ValueError("expected %d values, got %d in %s" % (self.ncols, len(row), row))
+        self.fileobj.write(np.asarray(row, dtype='<f8').tobytes())
+        self.nrows += 1
+        self.ncalls = ncalls
+        return self.nrows - 1
+
+    def flush(self):
+        """Update number of calls in header and flush file to disk."""
+        self._write_header()
+        self.fileobj.flush()
+
+    def close(self):
+        """Update number of calls in header and close file."""
+        if not self.fileobj.closed:
+            self._write_header()
+        self.fileobj.close()
+
+
 class HDF5PointStore(FilePointStore):
     """Storage in a HDF5 file.
 
@@ -156,18 +348,46 @@ class HDF5PointStore(FilePointStore):
     so that they can be reused in another run.
 
     The format is a HDF5 file, which grows as needed.
+
+    New rows are collected in a memory buffer, and written to the file
+    in one block when the buffer is full, when the last write is more than
+    `flush_interval` seconds ago, and on :py:meth:`flush` and :py:meth:`close`.
     """
     FILES_OPENED = []
 
-    def __init__(self, filepath, ncols, **h5_file_args):
+    def __init__(self, filepath, ncols, buffer_size=1000, flush_interval=10, compression=None, lazy=False, **h5_file_args):
         """Load and append to storage at filepath.
 
         File contains *ncols* columns in 'points' dataset (Lmin, L, and others).
-        h5_file_args are passed on to hdf5.File.
+
+        Parameters
+        ----------
+        filepath: str
+            path to the HDF5 file
+        ncols: int
+            number of columns
+        buffer_size: int
+            maximum number of rows kept in memory before writing to file.
+            Also used as the number of rows per chunk in the file.
+        flush_interval: float
+            maximum time in seconds to keep rows in memory before writing to file.
+        compression: None or str
+            compression filter (for example, 'gzip' or 'lzf') for the
+            'points' dataset, if it is created.
+        lazy: bool
+            if True, keep the stored points on disk, and only
+            load the Lmin and L columns into memory.
+            Reduces memory use when resuming from large files.
+        h5_file_args: dict
+            passed on to hdf5.File.
         """
         import h5py
         self.ncols = int(ncols)
         self.stack_empty = True
+        self.buffer_size = max(1, int(buffer_size))
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.lazy = lazy
         h5_file_args['mode'] = h5_file_args.get('mode', 'a')
         
         # An annoying part of jupyter notebooks is that they keep all the variables
@@ -177,29 +397,43 @@ class HDF5PointStore(FilePointStore):
         # even when overwriting/truncating (mode='w')
         # To avoid this problem, we keep track of all the files opened in this process
         # and when another HDF5PointStore instance is created with the same path,
-        # we close the old one. Further operations on it will then likely fail.
-        for i, (filepath2, fileobj2) in enumerate(HDF5PointStore.FILES_OPENED):
+        # we close the old one (writing its buffered points).
+        # Further operations on it will then likely fail.
+        for i, (filepath2, store2) in enumerate(HDF5PointStore.FILES_OPENED):
             if filepath == filepath2:
-                fileobj2.close()
+                store2.close()
                 HDF5PointStore.FILES_OPENED.pop(i)
 
         self.fileobj = h5py.File(filepath, **h5_file_args)
-        HDF5PointStore.FILES_OPENED.append((filepath, self.fileobj))
-        self._load()
+        try:
+            self._load()
+        except Exception:
+            self.fileobj.close()
+            raise
+        HDF5PointStore.FILES_OPENED.append((filepath, self))
 
     def _load(self):
         """Load from data file."""
         if 'points' not in self.fileobj:
             self.fileobj.create_dataset(
                 'points', dtype=np.float,
-                shape=(0, self.ncols), maxshape=(None, self.ncols))
+                shape=(0, self.ncols), maxshape=(None, self.ncols),
+                chunks=(self.buffer_size, self.ncols),
+                compression=self.compression)
 
         self.nrows, ncols = self.fileobj['points'].shape
         if ncols != self.ncols:
             raise IOError("Tried to resume from file '%s', which has a different number of columns!" % (self.fileobj))
-        points = self.fileobj['points'][:]
-        self.stack = list(enumerate(points))
+        if self.lazy:
+            points = self.fileobj['points']
+        else:
+            points = self.fileobj['points'][:]
+        self.stack = PointStack(points)
         self.ncalls = self.fileobj.attrs.get('ncalls', len(self.stack))
+        self.nrows_written = self.nrows
+        self.ncalls_written = self.ncalls
+        self.buffer = np.empty((self.buffer_size, self.ncols))
+        self.last_flush_time = time.time()
         self.reset()
 
     def add(self, row, ncalls):
@@ -207,11 +441,33 @@ class HDF5PointStore(FilePointStore):
         if len(row) != self.ncols:
             raise ValueError("expected %d values, got %d in %s" % (self.ncols, len(row), row))
 
-        # make space:
-        self.fileobj['points'].resize(self.nrows + 1, axis=0)
-        # insert:
-        self.fileobj['points'][self.nrows,:] = row
-        if self.ncalls != ncalls:
-            self.ncalls = self.fileobj.attrs['ncalls'] = ncalls
+        self.buffer[self.nrows - self.nrows_written,:] = row
+        self.ncalls = ncalls
         self.nrows += 1
+        if self.nrows - self.nrows_written >= self.buffer_size or \
+                time.time() - self.last_flush_time > self.flush_interval:
+            self._write_buffer()
         return self.nrows - 1
+
+    def _write_buffer(self):
+        """Write buffered rows and number of calls to the file."""
+        nbuffered = self.nrows - self.nrows_written
+        if nbuffered > 0:
+            # make space and insert, all at once
+            self.fileobj['points'].resize(self.nrows, axis=0)
+            self.fileobj['points'][self.nrows_written:self.nrows,:] = self.buffer[:nbuffered,:]
+            self.nrows_written = self.nrows
+        if self.ncalls != self.ncalls_written:
+            self.fileobj.attrs['ncalls'] = self.ncalls_written = self.ncalls
+        self.last_flush_time = time.time()
+
+    def flush(self):
+        """Write buffered points and flush file to disk."""
+        self._write_buffer()
+        self.fileobj.flush()
+
+    def close(self):
+        """Write buffered points and close file."""
+        if self.fileobj:
+            self._write_buffer()
+        self.fileobj.close()
@@ -110,6 +110,182 @@ def vectorize(function):
     return vectorized
 
 
+def vectorize_with_pool(function, pool):
+    """Vectorize likelihood function, evaluating points concurrently.
+
+    Each point is submitted as a separate task to `pool`,
+    a :py:class:`concurrent.futures.Executor`.
+    The results are collected as they finish.
+
+    Parameters
+    -----------
+    function: function
+        function receiving a single point
+    pool: concurrent.futures.Executor
+        pool of workers. For a ProcessPoolExecutor,
+        `function` needs to be picklable.
+
+    Returns
+    --------
+    vectorized: function
+        function receiving an array of points, returns the array of results.
+    """
+    from concurrent.futures import as_completed
+
+    def vectorized(args):
+        """ vectorized version of function, evaluated in pool"""
+        futures = {pool.submit(function, arg): i for i, arg in enumerate(args)}
+        results = [None] * len(futures)
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+        return np.asarray(results)
+
+    vectorized.__name__ = function.__name__
+    return vectorized
+
+
+def _shared_array_worker(function, conn):
+    """Evaluate `function` on blocks of shared memory arrays.
+
+    Receives (input name, output name, shape, start, stop) tasks from the
+    connection `conn`, writes the results of rows start to stop into
+    the output array and replies with None, or the exception raised.
+    Stops when receiving None.
+    """
+    from multiprocessing import shared_memory
+    buffers = {}
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        name_in, name_out, shape, start, stop = task
+        try:
+            for name in name_in, name_out:
+                if name not in buffers:
+                    buffers[name] = shared_memory.SharedMemory(name=name)
+            # forget segments which the main process has replaced
+            for name in list(buffers.keys()):
+                if name not in (name_in, name_out):
+                    buffers.pop(name).close()
+            x = np.ndarray(shape, dtype=float, buffer=buffers[name_in].buf)
+            y = np.ndarray(shape[:1], dtype=float, buffer=buffers[name_out].buf)
+            y[start:stop] = function(x[start:stop])
+            del x, y
+            conn.send(None)
+        except Exception as e:
+            conn.send(e)
+    for buffer in buffers.values():
+        buffer.close()
+    conn.close()
+
+
+class SharedMemoryPool(object):
+    """Vectorized function evaluated by a pool of worker processes.
+
+    Calling the pool with an array of points splits the points into
+    one block per worker. The points and results are exchanged through
+    :py:mod:`multiprocessing.shared_memory`, so only a small task
+    description is sent to each worker, instead of pickled arrays.
+
+    Where available, the workers are forked, so `function` does not
+    need to be picklable. Requires Python 3.8 or newer.
+    """
+
+    def __init__(self, function, num_workers):
+        """Start the workers.
+
+        Parameters
+        -----------
+        function: function
+            vectorized function receiving an array of points,
+            returns an array of floats, one per point.
+        num_workers: int
+            number of worker processes.
+        """
+        import multiprocessing
+        from multiprocessing import resource_tracker
+        import weakref
+        assert num_workers > 0, num_workers
+        # the workers should register shared memory with our resource
+        # tracker, instead of each starting one, which would warn about
+        # already freed segments at exit
+        resource_tracker.ensure_running()
+        if 'fork' in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context('fork')
+        else:
+            ctx = multiprocessing.get_context()
+        self.num_workers = int(num_workers)
+        self.conns = []
+        self.processes = []
+        for i in range(self.num_workers):
+            conn, child_conn = ctx.Pipe()
+            process = ctx.Process(target=_shared_array_worker, args=(function, child_conn))
+            process.daemon = True
+            process.start()
+            child_conn.close()
+            self.conns.append(conn)
+            self.processes.append(process)
+        # shared memory segments for the points and the results
+        self.buffers = [None, None]
+        self.__name__ = function.__name__
+        self._finalizer = weakref.finalize(self, SharedMemoryPool._shutdown, self.conns, self.processes, self.buffers)
+
+    def _reserve(self, shape):
+        """Make the shared memory segments large enough for `shape`."""
+        from multiprocessing import shared_memory
+        nbytes = [int(np.prod(shape)) * 8, shape[0] * 8]
+        for i, nbytes_needed in enumerate(nbytes):
+            if self.buffers[i] is None or self.buffers[i].size < nbytes_needed:
+                if self.buffers[i] is not None:
+                    self.buffers[i].close()
+                    self.buffers[i].unlink()
+                # over-allocate, so that growing batches rarely need new segments
+                self.buffers[i] = shared_memory.SharedMemory(create=True, size=max(8, 2 * nbytes_needed))
+
+    def __call__(self, args):
+        """Evaluate function on all points `args`, distributed over the workers."""
+        assert self._finalizer.alive, 'pool has been closed'
+        x = np.asarray(args, dtype=float)
+        shape = x.shape
+        if len(x) == 0:
+            return np.empty(0)
+        self._reserve(shape)
+        np.ndarray(shape, dtype=float, buffer=self.buffers[0].buf)[:] = x
+        bounds = np.linspace(0, len(x), self.num_workers + 1).astype(int)
+        active = []
+        for conn, start, stop in zip(self.conns, bounds[:-1], bounds[1:]):
+            if stop > start:
+                conn.send((self.buffers[0].name, self.buffers[1].name, shape, start, stop))
+                active.append(conn)
+        errors = [conn.recv() for conn in active]
+        for e in errors:
+            if e is not None:
+                raise e
+        return np.ndarray(shape[:1], dtype=float, buffer=self.buffers[1].buf).copy()
+
+    def close(self):
+        """Stop the workers and free the shared memory."""
+        self._finalizer()
+
+    @staticmethod
+    def _shutdown(conns, processes, buffers):
+        for conn in conns:
+            try:
+                conn.send(None)
+                conn.close()
+            except (OSError, ValueError):
+                pass
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        for i, buffer in enumerate(buffers):
+            if buffer is not None:
+                buffer.close()
+                buffer.unlink()
+                buffers[i] = None
+
+
 """Square root of a small number."""
 SQRTEPS = (float(np.finfo(np.float64).eps))**0.5
 
@@ -189,6 +365,137 @@ def listify(*args):
     return out
 
 
+class LazyDict(dict):
+    """Dictionary with entries that are computed when first accessed.
+
+    Entries are registered with :py:meth:`set_lazy`. They count as
+    members of the dictionary, and are computed (once) when accessed
+    by key, or when the whole dictionary is needed, for example
+    when iterating, copying, comparing, printing or pickling it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initialise like a dict."""
+        dict.__init__(self, *args, **kwargs)
+        self._lazy = {}
+
+    def set_lazy(self, key, function):
+        """Set entry `key` to be computed by calling `function()`."""
+        dict.pop(self, key, None)
+        self._lazy[key] = function
+
+    def compute_all(self):
+        """Compute all pending entries."""
+        for key in list(self._lazy.keys()):
+            self[key]
+
+    def __missing__(self, key):
+        """Compute a pending entry."""
+        if key not in self._lazy:
+            raise KeyError(key)
+        value = self._lazy[key]()
+        del self._lazy[key]
+        dict.__setitem__(self, key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        """Set entry, replacing a pending one."""
+        self._lazy.pop(key, None)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        """Remove entry, also if it is pending."""
+        if key in self._lazy:
+            del self._lazy[key]
+        else:
+            dict.__delitem__(self, key)
+
+    def __contains__(self, key):
+        """Check for entry, without computing it."""
+        return key in self._lazy or dict.__contains__(self, key)
+
+    def __len__(self):
+        """Number of entries, including pending ones."""
+        return dict.__len__(self) + len(self._lazy)
+
+    def __iter__(self):
+        """Iterate over keys."""
+        self.compute_all()
+        return dict.__iter__(self)
+
+    def __repr__(self):
+        """Representation of the computed dictionary."""
+        self.compute_all()
+        return dict.__repr__(self)
+
+    def __eq__(self, other):
+        """Compare computed dictionaries."""
+        self.compute_all()
+        if isinstance(other, LazyDict):
+            other.compute_all()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        """Compare computed dictionaries."""
+        return not self == other
+
+    def __reduce__(self):
+        """Pickle the computed dictionary."""
+        return (self.__class__, (dict(self.items()),))
+
+    def keys(self):
+        """Keys of all entries."""
+        self.compute_all()
+        return dict.keys(self)
+
+    def values(self):
+        """Values of all entries."""
+        self.compute_all()
+        return dict.values(self)
+
+    def items(self):
+        """Key, value pairs of all entries."""
+        self.compute_all()
+        return dict.items(self)
+
+    def get(self, key, default=None):
+        """Get entry `key` if it exists, otherwise `default`."""
+        return self[key] if key in self else default
+
+    def pop(self, key, *default):
+        """Remove entry `key` and return it."""
+        if key in self._lazy:
+            self[key]
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        """Remove and return a (key, value) pair."""
+        self.compute_all()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        """Get entry `key`, and set it to `default` if it does not exist."""
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        """Update entries like a dict."""
+        other = dict(*args, **kwargs)
+        for key in other:
+            self._lazy.pop(key, None)
+        dict.update(self, other)
+
+    def clear(self):
+        """Remove all entries."""
+        self._lazy.clear()
+        dict.clear(self)
+
+    def copy(self):
+        """Copy of the computed dictionary."""
+        return self.__class__(self.items())
+
+
 def quantile(x, q, weights=None):
     """Compute (weighted) quantiles from an input set of samples.
 